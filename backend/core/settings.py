@@ -83,10 +83,84 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Concurrent writers wait for the write lock instead of failing
+            # with "database is locked" when a read transaction upgrades
+            'timeout': 20,
+            'transaction_mode': 'IMMEDIATE',
+        },
+        'TEST': {
+            # A file, not shared-cache memory, so tests can run checkouts on threads
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# The catalog response cache relies on a cache shared by all workers; switch
+# to Redis or Memcached when running more than one process.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Seconds a cached catalog response is kept for a given catalog version
+CATALOG_CACHE_TIMEOUT = 600
+
+# Seconds the detail payload of a delivered or cancelled order is cached
+ORDER_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Seconds a user's cart payload is cached between cart changes
+CART_CACHE_TIMEOUT = 300
+
+# Seconds the pricing rules (tax, shipping) are cached. A rule change clears
+# the cache of the worker that saved it; other workers with a per-process
+# cache pick it up once their copy expires.
+PRICING_RULES_CACHE_TIMEOUT = 300
+
+# Where active carts are kept between requests (products/cart_store.py).
+# Changes are written through to the database; use
+# 'products.cart_store.LocalMemoryCartStore' for tests.
+CART_STORE_BACKEND = 'products.cart_store.CacheCartStore'
+
+# Days a cart is kept without any change before sweep_stale_carts deletes it
+CART_RETENTION_DAYS = 30
+
+# Seconds stock stays held for a cart line after it was added or changed
+STOCK_RESERVATION_TTL = 15 * 60
+
+# Seconds the response to a request with an Idempotency-Key header is
+# replayed for, and how long a duplicate waits for the first request to finish
+IDEMPOTENCY_KEY_TTL = 60 * 60 * 24
+IDEMPOTENCY_WAIT_TIMEOUT = 10
+# Seconds after which a request that never finished loses its claim on a key,
+# so a retry can run it again; keep it well above the slowest request
+IDEMPOTENCY_PROCESSING_TIMEOUT = 60
+
+# Background jobs (products/jobs.py), run by `manage.py run_jobs`. Failed
+# jobs are retried up to JOB_MAX_ATTEMPTS times, waiting JOB_RETRY_BACKOFF
+# seconds, doubled on every attempt; a job running for longer than
+# JOB_TIMEOUT seconds is assumed lost and queued again.
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_BACKOFF = 30
+JOB_TIMEOUT = 10 * 60
+JOB_WORKER_CONCURRENCY = 2
+
+# Products at or below this stock after an order trigger a low stock alert
+LOW_STOCK_THRESHOLD = 5
+
+# Days deleted catalog rows are remembered for delta sync clients
+CATALOG_TOMBSTONE_RETENTION_DAYS = 30
+
+# Serialize the product, cart and order lists from values() rows instead of
+# model instances (products/fastserializers.py). The output is identical.
+FAST_SERIALIZATION = True
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -136,6 +210,11 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # Encodes with orjson when installed, byte-identical to JSONRenderer
+    'DEFAULT_RENDERER_CLASSES': [
+        'products.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 
 # CORS configuration
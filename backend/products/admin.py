@@ -1,6 +1,9 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import Category, Product, CartItem, Order, OrderItem, Payment, Wishlist
+from .models import (
+    Category, Product, CartItem, Order, OrderItem, Payment, Wishlist, PricingRule, StockReservation, Job,
+    DailyProductSales, DailyCategorySales,
+)
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -8,11 +11,7 @@ class CategoryAdmin(admin.ModelAdmin):
     list_filter = ('is_active', 'created_at')
     search_fields = ('name', 'description')
     prepopulated_fields = {'name': ('name',)}
-    readonly_fields = ('created_at', 'updated_at')
-
-    def products_count(self, obj):
-        return obj.products.count()
-    products_count.short_description = 'Products Count'
+    readonly_fields = ('products_count', 'created_at', 'updated_at')
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
@@ -60,7 +59,7 @@ class CartItemAdmin(admin.ModelAdmin):
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
     extra = 0
-    readonly_fields = ('total',)
+    readonly_fields = ('total', 'product_name', 'product_image', 'sku', 'variant_attributes')
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
@@ -150,6 +149,37 @@ class WishlistAdmin(admin.ModelAdmin):
     search_fields = ('user__username', 'user__email', 'product__name')
     readonly_fields = ('created_at',)
 
+@admin.register(PricingRule)
+class PricingRuleAdmin(admin.ModelAdmin):
+    list_display = ('name', 'value', 'updated_at')
+    readonly_fields = ('updated_at',)
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ('user', 'product', 'variant', 'quantity', 'expires_at')
+    search_fields = ('user__username', 'product__name')
+    raw_id_fields = ('user', 'product', 'variant')
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'status', 'attempts', 'max_attempts', 'run_at', 'updated_at')
+    list_filter = ('status', 'name')
+    readonly_fields = ('locked_by', 'locked_at', 'last_error', 'created_at', 'updated_at')
+
+@admin.register(DailyProductSales)
+class DailyProductSalesAdmin(admin.ModelAdmin):
+    list_display = ('date', 'product', 'category', 'orders_count', 'units_sold', 'revenue')
+    list_filter = ('date', 'category')
+    search_fields = ('product__name',)
+    raw_id_fields = ('product',)
+    date_hierarchy = 'date'
+
+@admin.register(DailyCategorySales)
+class DailyCategorySalesAdmin(admin.ModelAdmin):
+    list_display = ('date', 'category', 'orders_count', 'units_sold', 'revenue')
+    list_filter = ('date', 'category')
+    date_hierarchy = 'date'
+
 # Customize admin site header
 admin.site.site_header = "E-Commerce Admin Panel"
 admin.site.site_title = "E-Commerce Admin"
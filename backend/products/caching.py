@@ -0,0 +1,138 @@
+"""
+Response caching for the anonymous catalog endpoints.
+
+Every cached catalog response is keyed by a global catalog version that is
+bumped whenever a Product, ProductVariant or Category changes (see
+``products.signals``). Bumping the version invalidates every cached page at
+once without having to track which pages a change affects.
+
+The ETag of a response is derived from the catalog version and the request
+URL, so a client revalidating with ``If-None-Match`` gets a 304 from a single
+cache read, before any database query runs.
+
+Finished orders (delivered or cancelled) no longer change, so their detail
+payload is cached per order as well. Each order has its own version, bumped
+whenever the order or one of its items is saved or deleted.
+
+Versions are kept per namespace ('catalog', 'order:<id>', and 'cart:<user
+id>' in ``products.cart``) by ``get_version`` / ``versioned_key`` /
+``bump_version``.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import parse_etags
+
+def get_version(namespace):
+    """The current version of the keys under ``namespace``, e.g. 'catalog' or 'cart:<user id>'"""
+    key = f'{namespace}:version'
+    version = cache.get(key)
+    if version is None:
+        # Seed with the current time so a cache flush or restart never hands
+        # out a version (and so an ETag) that was used for older content.
+        cache.add(key, int(time.time() * 1000), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def versioned_key(namespace, *parts):
+    """A cache key under the current version of ``namespace``"""
+    return ':'.join([namespace, str(get_version(namespace)), *map(str, parts)])
+
+
+def bump_version(namespace):
+    """Invalidate every key under ``namespace`` once the current transaction commits"""
+    transaction.on_commit(lambda: _bump_version(namespace))
+
+
+def _bump_version(namespace):
+    key = f'{namespace}:version'
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, int(time.time() * 1000), timeout=None)
+
+
+def get_catalog_version():
+    return get_version('catalog')
+
+
+def bump_catalog_version():
+    """Invalidate all cached catalog responses once the current transaction commits"""
+    bump_version('catalog')
+
+
+class CatalogCacheMixin:
+    """
+    Serve GET requests of a read-only viewset from the versioned catalog cache.
+
+    Only use this on views whose response does not depend on the requesting
+    user.
+    """
+    catalog_cache_timeout = None
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return super().dispatch(request, *args, **kwargs)
+
+        version = get_catalog_version()
+        fingerprint = hashlib.sha1(
+            f'{request.build_absolute_uri()}|{request.META.get("HTTP_ACCEPT", "")}'.encode()
+        ).hexdigest()
+        etag = f'"{version}-{fingerprint[:20]}"'
+
+        if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            response = HttpResponseNotModified()
+            response['ETag'] = etag
+            return response
+
+        key = f'catalog:{version}:{fingerprint}'
+        cached = cache.get(key)
+        if cached is not None:
+            content, content_type = cached
+            response = HttpResponse(content, content_type=content_type)
+            response['ETag'] = etag
+            return response
+
+        response = super().dispatch(request, *args, **kwargs)
+        if response.status_code == 200:
+            response.render()
+            cache.set(key, (response.content, response['Content-Type']), self.get_catalog_cache_timeout())
+            response['ETag'] = etag
+        return response
+
+    def get_catalog_cache_timeout(self):
+        if self.catalog_cache_timeout is not None:
+            return self.catalog_cache_timeout
+        return getattr(settings, 'CATALOG_CACHE_TIMEOUT', 600)
+
+
+# Finished order detail cache
+FINISHED_ORDER_STATUSES = ('delivered', 'cancelled')
+
+
+def _order_key(user_id, order_id, fieldset):
+    selection = '|'.join(f'{param}={",".join(sorted(names))}' for param, names in sorted(fieldset.items()))
+    digest = hashlib.sha1(selection.encode()).hexdigest()[:20]
+    return versioned_key(f'order:{order_id}', user_id, digest)
+
+
+def get_cached_order(user_id, order_id, fieldset):
+    """Return ``(payload, key)``; payload is None on a miss"""
+    key = _order_key(user_id, order_id, fieldset)
+    return cache.get(key), key
+
+
+def cache_order(key, order_status, payload):
+    """Cache an order detail payload if the order is finished"""
+    if order_status in FINISHED_ORDER_STATUSES:
+        cache.set(key, payload, getattr(settings, 'ORDER_CACHE_TIMEOUT', 60 * 60 * 24))
+
+
+def invalidate_order(order_id):
+    """Invalidate the cached details of an order once the current transaction commits"""
+    bump_version(f'order:{order_id}')
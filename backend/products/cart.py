@@ -0,0 +1,181 @@
+"""
+Cart totals and the per-user cart cache.
+
+``cart_quote`` prices a cart from a single aggregate query for its item count
+and subtotal, each line priced in SQL the same way as
+``CartItem.total_price``; tax and shipping come from ``products.pricing``.
+
+The cart payload returned by ``cart_list`` is cached per user. The cache key
+carries a per-user cart version, bumped whenever one of the user's cart items
+changes (see ``products.signals``), and the catalog version, since product
+prices and stock are part of the payload. A cart being polled without changes
+costs a single cache read.
+
+``sweep_stale_carts`` deletes abandoned carts, those with no line changed for
+``CART_RETENTION_DAYS``, in small keyset-paged batches.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, DecimalField, Exists, FilteredRelation, OuterRef, Q, Subquery, Sum
+from django.utils import timezone
+
+from .caching import bump_version, get_catalog_version, get_version
+from .models import CartItem, Product, ProductVariant
+from .pricing import PricingEngine, line_total_expression, to_paise
+
+
+def cart_totals(user):
+    """Return ``(items_count, subtotal in paise)`` of the user's cart from one aggregate query"""
+    totals = CartItem.objects.filter(user=user).aggregate(
+        items_count=Count('id'),
+        subtotal=Sum(line_total_expression(), output_field=DecimalField(max_digits=12, decimal_places=2)),
+    )
+    return totals['items_count'], to_paise(totals['subtotal'] or 0)
+
+
+def cart_quote(user, coupon=None):
+    """Price the user's cart"""
+    items_count, subtotal = cart_totals(user)
+    return PricingEngine(coupon=coupon).quote(subtotal, items_count)
+
+
+def cart_snapshot(user, lock=False):
+    """
+    The user's cart items with their products and variants, read with one
+    query. With ``lock`` the cart rows stay locked until the transaction
+    ends, so the cart cannot change while an order is being placed from it.
+    """
+    cart_items = CartItem.objects.filter(user=user).select_related('product', 'variant__product')
+    if lock:
+        cart_items = cart_items.select_for_update(of=('self',))
+    return list(cart_items)
+
+
+def line_stock(product_id, variant_id=None, active_only=True):
+    """
+    Stock available for a cart line, read with one query. Raises
+    Product.DoesNotExist or ProductVariant.DoesNotExist when the product or
+    variant is missing (or inactive, with ``active_only``).
+    """
+    products = Product.objects.filter(id=product_id)
+    variants = ProductVariant.objects.filter(id=variant_id, product=OuterRef('pk'))
+    if active_only:
+        products = products.filter(is_active=True)
+        variants = variants.filter(is_active=True)
+    if variant_id:
+        products = products.annotate(variant_stock=Subquery(variants.values('stock_quantity')))
+        row = products.values('stock_quantity', 'variant_stock').first()
+    else:
+        row = products.values('stock_quantity').first()
+
+    if row is None:
+        raise Product.DoesNotExist
+    if not variant_id:
+        return row['stock_quantity']
+    if row['variant_stock'] is None:
+        raise ProductVariant.DoesNotExist
+    return row['variant_stock']
+
+
+def stock_levels(product_ids, variant_ids):
+    """
+    Read the state of many products and variants with one query. Returns
+    ``(products, variants)``: ``{id: (is_active, stock_quantity)}`` and
+    ``{id: (product_id, is_active, stock_quantity)}``.
+    """
+    products, variants = {}, {}
+    queryset = Product.objects.filter(id__in=product_ids)
+    if not variant_ids:
+        for product_id, is_active, stock in queryset.values_list('id', 'is_active', 'stock_quantity'):
+            products[product_id] = (is_active, stock)
+        return products, variants
+
+    rows = (
+        queryset
+        .annotate(variant=FilteredRelation('variants', condition=Q(variants__id__in=variant_ids)))
+        .values_list('id', 'is_active', 'stock_quantity',
+                     'variant__id', 'variant__is_active', 'variant__stock_quantity')
+    )
+    for product_id, is_active, stock, variant_id, variant_active, variant_stock in rows:
+        products[product_id] = (is_active, stock)
+        if variant_id is not None:
+            variants[variant_id] = (product_id, variant_active, variant_stock)
+    return products, variants
+
+
+# Per-user cart cache
+def get_cart_version(user_id):
+    return get_version(f'cart:{user_id}')
+
+
+def _cart_key(user_id, version):
+    return f'cart:{user_id}:{version}:{get_catalog_version()}'
+
+
+def get_cached_cart(user_id):
+    """Return ``(payload, version)``; payload is None on a miss"""
+    version = get_cart_version(user_id)
+    return cache.get(_cart_key(user_id, version)), version
+
+
+def cache_cart(user_id, version, payload):
+    """Cache a cart payload built while the cart was at ``version``"""
+    cache.set(_cart_key(user_id, version), payload, getattr(settings, 'CART_CACHE_TIMEOUT', 300))
+
+
+def invalidate_cart(user_id):
+    """Invalidate the user's cached cart once the current transaction commits"""
+    bump_version(f'cart:{user_id}')
+
+
+# Abandoned carts
+def sweep_stale_carts(retention_days=None, chunk_size=500, pause=0):
+    """
+    Delete carts with no line changed in ``retention_days`` (default
+    ``CART_RETENTION_DAYS``). Returns ``(carts, lines)`` deleted.
+
+    Old lines are read in ``(updated_at, id)`` order, ``chunk_size`` at a time,
+    and each chunk's stale carts are deleted in their own short transaction,
+    sleeping ``pause`` seconds in between, so the sweep never holds write
+    locks for long. A cart is only deleted if none of its lines has changed
+    since the cutoff when the delete runs, so carts in use are left alone.
+    """
+    if retention_days is None:
+        retention_days = getattr(settings, 'CART_RETENTION_DAYS', 30)
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    fresh_lines = CartItem.objects.filter(user_id=OuterRef('user_id'), updated_at__gte=cutoff)
+    stale_lines = CartItem.objects.filter(updated_at__lt=cutoff).order_by('updated_at', 'id')
+
+    carts = lines = 0
+    position = None
+    while True:
+        chunk = stale_lines
+        if position is not None:
+            chunk = chunk.filter(
+                Q(updated_at__gt=position[0]) | Q(updated_at=position[0], id__gt=position[1])
+            )
+        rows = list(chunk.values_list('updated_at', 'id', 'user_id')[:chunk_size])
+        if not rows:
+            break
+        position = rows[-1][:2]
+
+        with transaction.atomic():
+            doomed = CartItem.objects.filter(
+                user_id__in={row[2] for row in rows}, updated_at__lt=cutoff
+            ).exclude(Exists(fresh_lines))
+            user_ids = set(doomed.values_list('user_id', flat=True))
+            # Deleting sends the CartItem signals, which invalidate the cached
+            # carts and the cart store
+            deleted, _ = doomed.delete() if user_ids else (0, {})
+        carts += len(user_ids)
+        lines += deleted
+
+        if len(rows) < chunk_size:
+            break
+        if pause:
+            time.sleep(pause)
+    return carts, lines
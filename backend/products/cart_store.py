@@ -0,0 +1,342 @@
+"""
+Pluggable storage for active carts.
+
+A cart store keeps the lines of each user's cart (item id, product, variant
+and quantity) outside the database, so cart mutations can find the line they
+change without reading the cart back first. Every change is written through
+to ``CartItem`` in the same request: the database stays the source of truth
+for checkout and the admin, and the store only saves reads. Lines are loaded
+from the database on a miss, and ``CartItem`` save/delete signals discard a
+user's stored lines so changes made elsewhere are never masked. Stored lines
+can still be stale (another process may have cached an older read), so they
+are only a hint: an item they miss is looked up in the database before it is
+reported missing.
+
+Backends, selected with the ``CART_STORE_BACKEND`` setting:
+
+* ``CacheCartStore`` keeps carts in the Django cache (the default),
+* ``LocalMemoryCartStore`` keeps them in a process-local dict, for tests and
+  single-process development.
+"""
+import copy
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import reservations
+from .cart import invalidate_cart, stock_levels
+from .models import CartItem
+
+DEFAULT_BACKEND = 'products.cart_store.CacheCartStore'
+LINE_FIELDS = ('id', 'product_id', 'variant_id', 'quantity')
+
+
+class CartOperationError(Exception):
+    """A batch of cart operations was rejected; ``errors`` lists the failing operations"""
+
+    def __init__(self, errors):
+        super().__init__('Invalid cart operations')
+        self.errors = errors
+
+
+class BaseCartStore:
+    """Cart lines per user, stored by ``_load`` / ``_save`` / ``_discard``"""
+
+    def _load(self, user_id):
+        raise NotImplementedError
+
+    def _save(self, user_id, lines):
+        raise NotImplementedError
+
+    def _discard(self, user_id):
+        raise NotImplementedError
+
+    def get_lines(self, user_id):
+        """Return the user's cart lines keyed by item id"""
+        lines = self._load(user_id)
+        if lines is None:
+            lines = self._read_lines(user_id)
+            self._save_on_commit(user_id, lines)
+        return lines
+
+    def _read_lines(self, user_id):
+        return {
+            row['id']: row
+            for row in CartItem.objects.filter(user_id=user_id).values(*LINE_FIELDS)
+        }
+
+    def get_line(self, user_id, item_id):
+        """
+        Return a line of the cart, or None when it does not exist. Stored
+        lines can be stale, so a miss is checked against the database and
+        the stored lines are discarded when they missed a row.
+        """
+        line = self.get_lines(user_id).get(item_id)
+        if line is None:
+            line = CartItem.objects.filter(id=item_id, user_id=user_id).values(*LINE_FIELDS).first()
+            if line is not None:
+                self._discard(user_id)
+        return line
+
+    def find_line(self, user_id, product_id, variant_id=None):
+        for line in self.get_lines(user_id).values():
+            if line['product_id'] == product_id and line['variant_id'] == variant_id:
+                return line
+        return None
+
+    def add(self, user_id, product_id, variant_id, quantity):
+        """
+        Add a new line to the cart. Stored lines can be stale, so the line
+        may exist already: returns ``(line, created)``, with the existing line
+        unchanged when ``created`` is False.
+        """
+        lines = self.get_lines(user_id)
+        item, created = CartItem.objects.get_or_create(
+            user_id=user_id, product_id=product_id, variant_id=variant_id, defaults={'quantity': quantity}
+        )
+        line = {field: getattr(item, field) for field in LINE_FIELDS}
+        if not created:
+            # Forget the stale lines right away, even if the caller rolls back
+            self._discard(user_id)
+            return line, False
+        lines[item.id] = line
+        self._save_on_commit(user_id, lines)
+        return line, True
+
+    def set_quantity(self, user_id, item_id, quantity):
+        """Change the quantity of a line; returns False when the line does not exist"""
+        lines = self.get_lines(user_id)
+        updated = CartItem.objects.filter(id=item_id, user_id=user_id).update(
+            quantity=quantity, updated_at=timezone.now()
+        )
+        if not updated:
+            self.discard(user_id)
+            return False
+
+        # update() sends no signals, so invalidate the cached cart here
+        invalidate_cart(user_id)
+        if item_id in lines:
+            lines[item_id]['quantity'] = quantity
+            self._save_on_commit(user_id, lines)
+        else:
+            self.discard(user_id)
+        return True
+
+    def remove(self, user_id, item_id):
+        """Remove a line; returns False when the line does not exist"""
+        lines = self.get_lines(user_id)
+        with transaction.atomic():
+            # Release the hold of the row deleted, whatever the stored lines say
+            line = (
+                CartItem.objects.select_for_update().filter(id=item_id, user_id=user_id)
+                .values('product_id', 'variant_id').first()
+            )
+            if line is None:
+                self.discard(user_id)
+                return False
+            CartItem.objects.filter(id=item_id).delete()
+            reservations.release(user_id, [(line['product_id'], line['variant_id'])])
+        lines.pop(item_id, None)
+        self._save_on_commit(user_id, lines)
+        return True
+
+    def clear(self, user_id):
+        """Remove every line of the cart and return the number removed"""
+        deleted, _ = CartItem.objects.filter(user_id=user_id).delete()
+        reservations.release(user_id)
+        self._save_on_commit(user_id, {})
+        return deleted
+
+    def apply_operations(self, user_id, operations):
+        """
+        Apply a batch of add/update/remove/clear operations in one transaction.
+
+        Operations are first replayed on the stored lines, then stock is
+        checked for every touched product and variant with one query, and
+        the result is written with one delete, one bulk_update and one
+        bulk_create, after holding stock for the changed lines. A line
+        removed and added again in the same batch keeps its row. Raises
+        CartOperationError, without changing anything, when an operation is
+        invalid or stock cannot be held.
+        """
+        try:
+            return self._apply_operations(user_id, operations)
+        except IntegrityError:
+            # The stored lines missed a row the batch then tried to create:
+            # replay the batch on the lines read from the database
+            self._discard(user_id)
+            return self._apply_operations(user_id, operations)
+
+    def _apply_operations(self, user_id, operations):
+        lines = self.get_lines(user_id)
+        if any(operation['item_id'] not in lines for operation in operations if 'item_id' in operation):
+            # The stored lines may be stale: check unknown items against the database
+            self._discard(user_id)
+            lines = self._read_lines(user_id)
+        cart = {
+            (line['product_id'], line['variant_id']): {**line, 'removed': False, 'changed': False}
+            for line in lines.values()
+        }
+        keys_by_id = {line['id']: key for key, line in cart.items()}
+        errors = []
+
+        for index, operation in enumerate(operations):
+            op = operation['op']
+            if op == 'clear':
+                for entry in cart.values():
+                    entry['removed'] = True
+                continue
+
+            if op == 'add':
+                key = (operation['product_id'], operation.get('variant_id') or None)
+                entry = cart.get(key)
+                if entry is None:
+                    entry = cart[key] = {
+                        'id': None, 'product_id': key[0], 'variant_id': key[1], 'quantity': 0, 'removed': False,
+                    }
+                if entry['removed']:
+                    entry['removed'] = False
+                    entry['quantity'] = 0
+                entry['quantity'] += operation['quantity']
+                entry.update(changed=True, added=True, index=index)
+                continue
+
+            entry = cart.get(keys_by_id.get(operation['item_id']))
+            if entry is None or entry['removed']:
+                errors.append({'index': index, 'errors': {'item_id': 'Cart item not found.'}})
+            elif op == 'update':
+                entry['quantity'] = operation['quantity']
+                entry.update(changed=True, index=index)
+            else:
+                entry['removed'] = True
+
+        # Validate stock for all touched products and variants in one query
+        touched = [entry for entry in cart.values() if entry['changed'] and not entry['removed']]
+        products, variants = stock_levels(
+            {entry['product_id'] for entry in touched},
+            {entry['variant_id'] for entry in touched if entry['variant_id']},
+        )
+        for entry in touched:
+            error = self._line_error(entry, products, variants)
+            if error:
+                errors.append({'index': entry['index'], 'errors': error})
+        if errors:
+            raise CartOperationError(sorted(errors, key=lambda error: error['index']))
+
+        now = timezone.now()
+        removed_ids = [entry['id'] for entry in cart.values() if entry['removed'] and entry['id']]
+        updated = [
+            CartItem(id=entry['id'], quantity=entry['quantity'], updated_at=now)
+            for entry in touched if entry['id']
+        ]
+        created = [
+            CartItem(user_id=user_id, product_id=entry['product_id'],
+                     variant_id=entry['variant_id'], quantity=entry['quantity'])
+            for entry in touched if not entry['id']
+        ]
+        with transaction.atomic():
+            try:
+                reservations.reserve(user_id, [
+                    (entry['product_id'], entry['variant_id'], entry['quantity']) for entry in touched
+                ])
+            except reservations.InsufficientStock as error:
+                raise CartOperationError(sorted((
+                    {'index': cart[key]['index'],
+                     'errors': {'quantity': f'Only {available} items available in stock.'}}
+                    for key, available in error.available.items()
+                ), key=lambda error: error['index']))
+            reservations.release(user_id, [
+                key for key, entry in cart.items() if entry['removed'] and entry['id']
+            ])
+            if removed_ids:
+                CartItem.objects.filter(user_id=user_id, id__in=removed_ids).delete()
+            if updated:
+                CartItem.objects.bulk_update(updated, ['quantity', 'updated_at'])
+            if created:
+                CartItem.objects.bulk_create(created)
+            # bulk_update() and bulk_create() send no signals
+            invalidate_cart(user_id)
+            self._save_on_commit(user_id, {
+                item.id: {field: getattr(item, field) for field in LINE_FIELDS}
+                for item in created
+            } | {
+                entry['id']: {field: entry[field] for field in LINE_FIELDS}
+                for entry in cart.values() if entry['id'] and not entry['removed']
+            })
+
+    def _line_error(self, entry, products, variants):
+        product = products.get(entry['product_id'])
+        if product is None or (entry.get('added') and not product[0]):
+            return {'product_id': 'Product not found or inactive.'}
+        available_stock = product[1]
+        if entry['variant_id']:
+            variant = variants.get(entry['variant_id'])
+            if variant is None or variant[0] != entry['product_id'] or (entry.get('added') and not variant[1]):
+                return {'variant_id': 'Product variant not found or inactive.'}
+            available_stock = variant[2]
+        if entry['quantity'] > available_stock:
+            return {'quantity': f'Only {available_stock} items available in stock.'}
+        return None
+
+    def discard(self, user_id):
+        """Forget the stored lines once the current transaction commits"""
+        transaction.on_commit(lambda: self._discard(user_id))
+
+    def _save_on_commit(self, user_id, lines):
+        # Stored after commit, so a rolled back write never reaches the store.
+        # This runs after any discard queued by the CartItem signals.
+        transaction.on_commit(lambda: self._save(user_id, lines))
+
+
+class CacheCartStore(BaseCartStore):
+    """Carts in the Django cache named by ``CART_STORE_CACHE``"""
+
+    def __init__(self):
+        self.cache = caches[getattr(settings, 'CART_STORE_CACHE', 'default')]
+        self.timeout = getattr(settings, 'CART_STORE_TIMEOUT', 60 * 60 * 24)
+
+    def _key(self, user_id):
+        return f'cart:{user_id}:lines'
+
+    def _load(self, user_id):
+        return self.cache.get(self._key(user_id))
+
+    def _save(self, user_id, lines):
+        self.cache.set(self._key(user_id), lines, self.timeout)
+
+    def _discard(self, user_id):
+        self.cache.delete(self._key(user_id))
+
+
+class LocalMemoryCartStore(BaseCartStore):
+    """Carts in a process-local dict"""
+
+    def __init__(self):
+        self.carts = {}
+        self.lock = threading.Lock()
+
+    def _load(self, user_id):
+        with self.lock:
+            return copy.deepcopy(self.carts.get(user_id))
+
+    def _save(self, user_id, lines):
+        with self.lock:
+            self.carts[user_id] = copy.deepcopy(lines)
+
+    def _discard(self, user_id):
+        with self.lock:
+            self.carts.pop(user_id, None)
+
+
+_store = None
+
+
+def get_cart_store():
+    global _store
+    if _store is None:
+        _store = import_string(getattr(settings, 'CART_STORE_BACKEND', DEFAULT_BACKEND))()
+    return _store
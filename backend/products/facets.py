@@ -0,0 +1,161 @@
+"""
+Faceted filtering for the product list.
+
+``filter_products`` applies the facet filters from the query string.
+``facet_counts`` returns the number of matching products for every facet
+value with a fixed number of grouped queries, however many facets or values
+there are:
+
+* one aggregate with conditional counts for price, sale, stock and rating,
+* one GROUP BY for categories,
+* one UNION of GROUP BYs for the variant size, color and material.
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import CharField, Count, Exists, F, OuterRef, Q, Value
+from rest_framework.exceptions import ValidationError
+
+from .models import Product, ProductVariant
+
+PRICE_RANGES = [
+    (None, Decimal('500')),
+    (Decimal('500'), Decimal('1000')),
+    (Decimal('1000'), Decimal('5000')),
+    (Decimal('5000'), Decimal('20000')),
+    (Decimal('20000'), None),
+]
+MIN_RATINGS = [4, 3, 2, 1]
+VARIANT_ATTRIBUTES = ['size', 'color', 'material']
+
+
+def _decimal_param(params, name):
+    value = params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        raise ValidationError({name: 'A valid number is required.'})
+
+
+def _list_param(params, name):
+    value = params.get(name)
+    if not value:
+        return []
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def on_sale_filter():
+    return Q(old_price__isnull=False, old_price__gt=F('price'))
+
+
+def _price_range_filter(low, high):
+    query = Q()
+    if low is not None:
+        query &= Q(price__gte=low)
+    if high is not None:
+        query &= Q(price__lt=high)
+    return query
+
+
+def _price_range_key(low, high):
+    if low is None:
+        return f'0-{high}'
+    if high is None:
+        return f'{low}+'
+    return f'{low}-{high}'
+
+
+def filter_products(queryset, params):
+    """Apply the price, sale, rating, stock and variant attribute filters in ``params``"""
+    min_price = _decimal_param(params, 'min_price')
+    max_price = _decimal_param(params, 'max_price')
+    min_rating = _decimal_param(params, 'min_rating')
+
+    if min_price is not None:
+        queryset = queryset.filter(price__gte=min_price)
+    if max_price is not None:
+        queryset = queryset.filter(price__lte=max_price)
+    if min_rating is not None:
+        queryset = queryset.filter(rating__gte=min_rating)
+    if params.get('on_sale'):
+        queryset = queryset.filter(on_sale_filter())
+    if params.get('in_stock'):
+        queryset = queryset.filter(Product.in_stock_filter())
+
+    # All attribute filters must hold for the same variant
+    variant_filter = Q()
+    for attribute in VARIANT_ATTRIBUTES:
+        values = _list_param(params, attribute)
+        if values:
+            variant_filter &= Q(**{f'{attribute}__in': values})
+    if variant_filter:
+        matching_variants = ProductVariant.objects.filter(
+            variant_filter, product=OuterRef('pk'), is_active=True
+        )
+        queryset = queryset.filter(Exists(matching_variants))
+
+    return queryset
+
+
+def facet_counts(queryset):
+    """Count the products of ``queryset`` for every facet value"""
+    queryset = queryset.order_by()
+
+    aggregates = {
+        'on_sale': Count('id', filter=on_sale_filter()),
+        'in_stock': Count('id', filter=Product.in_stock_filter()),
+    }
+    for index, (low, high) in enumerate(PRICE_RANGES):
+        aggregates[f'price_{index}'] = Count('id', filter=_price_range_filter(low, high))
+    for rating in MIN_RATINGS:
+        aggregates[f'rating_{rating}'] = Count('id', filter=Q(rating__gte=rating))
+    totals = queryset.aggregate(**aggregates)
+
+    categories = (
+        queryset.values('category_id', 'category__name')
+        .annotate(count=Count('id'))
+        .order_by('category__name')
+    )
+
+    product_ids = queryset.values('id')
+    variant_groups = None
+    for attribute in VARIANT_ATTRIBUTES:
+        group = (
+            ProductVariant.objects.filter(product_id__in=product_ids, is_active=True)
+            .exclude(**{f'{attribute}__isnull': True})
+            .exclude(**{attribute: ''})
+            .order_by()
+            .values_list(Value(attribute, output_field=CharField()), attribute)
+            .annotate(count=Count('product_id', distinct=True))
+        )
+        variant_groups = group if variant_groups is None else variant_groups.union(group, all=True)
+
+    attributes = {attribute: [] for attribute in VARIANT_ATTRIBUTES}
+    for attribute, value, count in variant_groups:
+        attributes[attribute].append({'value': value, 'count': count})
+    for values in attributes.values():
+        values.sort(key=lambda item: item['value'])
+
+    return {
+        'categories': [
+            {'id': row['category_id'], 'name': row['category__name'], 'count': row['count']}
+            for row in categories
+        ],
+        'price_ranges': [
+            {
+                'key': _price_range_key(low, high),
+                'min': str(low) if low is not None else None,
+                'max': str(high) if high is not None else None,
+                'count': totals[f'price_{index}'],
+            }
+            for index, (low, high) in enumerate(PRICE_RANGES)
+        ],
+        'ratings': [
+            {'min_rating': rating, 'count': totals[f'rating_{rating}']}
+            for rating in MIN_RATINGS
+        ],
+        'on_sale': totals['on_sale'],
+        'in_stock': totals['in_stock'],
+        **attributes,
+    }
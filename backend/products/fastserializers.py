@@ -0,0 +1,350 @@
+"""
+Fast-path serialization for hot read endpoints.
+
+``FastSerializer`` compiles a DRF serializer class into a field plan once and
+then builds response dicts straight from ``QuerySet.values()`` rows, without
+instantiating models or running DRF's per-field attribute lookups. The output
+is identical to ``serializer.data`` of the original serializer:
+
+* model fields are converted with the bound DRF field's ``to_representation``,
+* primary key relations and file fields are resolved from their column,
+* model properties are evaluated on lightweight row proxies that carry the
+  columns listed in the serializer's ``field_dependencies``,
+* nested serializers are either joined into the same row (forward relations)
+  or fetched with one extra query per relation (reverse relations).
+
+Serializers using anything else (``SerializerMethodField``, ``source='*'``,
+undeclared properties) are reported as unsupported and callers fall back to
+DRF.
+"""
+import functools
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import FileField
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.fields import empty
+from rest_framework.relations import RelatedField
+from rest_framework.settings import api_settings
+
+# Compiled plans kept per process; each distinct field selection has its own
+PLAN_CACHE_SIZE = 256
+
+# Parent ids per query when fetching reverse relations, well below SQLite's
+# bound parameter limit.
+CHUNK_SIZE = 900
+
+
+class UnsupportedSerializer(Exception):
+    pass
+
+
+def is_enabled():
+    return getattr(settings, 'FAST_SERIALIZATION', False)
+
+
+_proxy_classes = {}
+
+
+def _proxy_class(model):
+    """A plain class carrying the model's properties, to evaluate them on row values"""
+    if model not in _proxy_classes:
+        properties = {}
+        for klass in reversed(model.__mro__):
+            properties.update({
+                name: value for name, value in vars(klass).items()
+                if isinstance(value, property) and name != 'pk'
+            })
+        _proxy_classes[model] = type(f'{model.__name__}Row', (), properties)
+    return _proxy_classes[model]
+
+
+class ProxySpec:
+    """The columns and relations a row proxy needs for the serializer's properties"""
+
+    def __init__(self, model, prefix):
+        self.model = model
+        self.prefix = prefix
+        self.attrs = {}
+        self.relations = {}
+
+    def add(self, path):
+        head, _, rest = path.partition('__')
+        field = self.model._meta.get_field(head)
+        if rest:
+            if not field.many_to_one and not field.one_to_one:
+                raise UnsupportedSerializer(f'Cannot follow {head} on {self.model.__name__}')
+            if head not in self.relations:
+                self.relations[head] = ProxySpec(field.related_model, f'{self.prefix}{head}__')
+            self.relations[head].add(rest)
+        else:
+            self.attrs[field.attname] = f'{self.prefix}{field.attname if field.is_relation else head}'
+
+    def lookups(self):
+        result = set(self.attrs.values())
+        for name, spec in self.relations.items():
+            result.add(f'{self.prefix}{name}')
+            result |= spec.lookups()
+        return result
+
+    def compile(self):
+        proxy_class = _proxy_class(self.model)
+        attrs = list(self.attrs.items())
+        relations = [(name, f'{self.prefix}{name}', spec.compile()) for name, spec in self.relations.items()]
+
+        def build(row):
+            proxy = proxy_class()
+            values = proxy.__dict__
+            for attr, key in attrs:
+                values[attr] = row[key]
+            for name, key, build_related in relations:
+                values[name] = None if row[key] is None else build_related(row)
+            return proxy
+        return build
+
+
+class Plan:
+    """Compiled field plan of one serializer, reading columns under ``prefix``"""
+
+    def __init__(self, serializer, model, prefix=''):
+        self.model = model
+        self.prefix = prefix
+        self.lookups = set()
+        self.entries = []
+        self.reverse = []
+        self.proxy = ProxySpec(model, prefix)
+        self.has_proxy = False
+        dependencies = getattr(serializer, 'field_dependencies', {})
+
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, serializers.SerializerMethodField) or field.source == '*':
+                raise UnsupportedSerializer(f'{name} cannot be compiled')
+
+            if isinstance(field, serializers.ListSerializer):
+                self._add_reverse(name, field)
+            elif isinstance(field, serializers.BaseSerializer):
+                self._add_forward(name, field)
+            else:
+                self._add_field(name, field, dependencies)
+
+        if self.has_proxy:
+            self.lookups |= self.proxy.lookups()
+            self.build_proxy = self.proxy.compile()
+
+    def _resolve(self, attrs):
+        """Follow forward relations; return (relation paths, final model field or None)"""
+        model = self.model
+        relations = []
+        for index, attr in enumerate(attrs):
+            try:
+                field = model._meta.get_field(attr)
+            except FieldDoesNotExist:
+                if index == len(attrs) - 1:
+                    return relations, None
+                raise UnsupportedSerializer(f'Unknown field {attr} on {model.__name__}')
+            if index == len(attrs) - 1:
+                return relations, field
+            if not (field.many_to_one or field.one_to_one) or field.auto_created:
+                raise UnsupportedSerializer(f'Cannot follow {attr} on {model.__name__}')
+            relations.append('__'.join(attrs[:index + 1]))
+            model = field.related_model
+        return relations, None
+
+    def _add_field(self, name, field, dependencies):
+        relations, model_field = self._resolve(field.source_attrs)
+        null_checks = [f'{self.prefix}{relation}' for relation in relations]
+        self.lookups.update(null_checks)
+
+        if model_field is None:
+            if relations or name not in dependencies:
+                raise UnsupportedSerializer(f'{name} needs field_dependencies')
+            for path in dependencies[name]:
+                self.proxy.add(path)
+            self.has_proxy = True
+            attr = field.source_attrs[0]
+            convert = None if isinstance(field, serializers.ReadOnlyField) else field.to_representation
+            self.entries.append((name, 'property', attr, convert, None))
+            return
+
+        if model_field.auto_created and not model_field.concrete:
+            raise UnsupportedSerializer(f'{name} is a reverse relation')
+        key = self.prefix + '__'.join(field.source_attrs)
+        self.lookups.add(key)
+        kind = 'value'
+        if isinstance(field, RelatedField):
+            convert = None
+        elif isinstance(model_field, FileField):
+            kind, convert = 'value_context', self._file_converter(field, model_field)
+        elif self._is_iso_datetime(field):
+            kind, convert = 'value_context', self._datetime_converter()
+        else:
+            convert = field.to_representation
+        self.entries.append((name, kind, key, convert, (null_checks, self._missing(field))))
+
+    def _missing(self, field):
+        """What DRF emits when a relation on the source path is empty"""
+        if field.default is not empty:
+            return field.get_default
+        if field.allow_null:
+            return lambda: None
+        return None
+
+    def _file_converter(self, field, model_field):
+        storage = model_field.storage
+        use_url = getattr(field, 'use_url', True)
+
+        def convert(name, context):
+            if not name:
+                return None
+            if not use_url:
+                return name
+            url = storage.url(name)
+            request = context['request']
+            if request is not None:
+                return request.build_absolute_uri(url)
+            return url
+        return convert
+
+    def _is_iso_datetime(self, field):
+        return (
+            settings.USE_TZ
+            and type(field) is serializers.DateTimeField
+            and getattr(field, 'format', api_settings.DATETIME_FORMAT).lower() == ISO_8601
+            and 'timezone' not in vars(field)
+        )
+
+    def _datetime_converter(self):
+        """DateTimeField.to_representation, with the current timezone looked up once per call"""
+        def convert(value, context):
+            value = value.astimezone(context['timezone']).isoformat()
+            if value.endswith('+00:00'):
+                value = value[:-6] + 'Z'
+            return value
+        return convert
+
+    def _add_forward(self, name, field):
+        relations, model_field = self._resolve(field.source_attrs)
+        if model_field is None or not (model_field.many_to_one or model_field.one_to_one) or model_field.auto_created:
+            raise UnsupportedSerializer(f'{name} is not a forward relation')
+        path = '__'.join(field.source_attrs)
+        child = Plan(field, model_field.related_model, prefix=f'{self.prefix}{path}__')
+        key = f'{self.prefix}{path}'
+        self.lookups.add(key)
+        self.lookups |= child.lookups
+        self.entries.append((name, 'one', key, child, None))
+
+    def _add_reverse(self, name, field):
+        try:
+            relation = self.model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            raise UnsupportedSerializer(f'{name} is not a reverse relation')
+        if not relation.one_to_many:
+            raise UnsupportedSerializer(f'{name} is not a reverse foreign key')
+        child = Plan(field.child, relation.related_model)
+        parent_key = f'{self.prefix}id'
+        self.lookups.add(parent_key)
+        self.reverse.append((name, child, relation.field.attname, parent_key))
+        self.entries.append((name, 'many', parent_key, child, None))
+
+    def fetch_related(self, rows, related):
+        """Load reverse relations of ``rows`` (and of nested plans) into ``related``"""
+        for name, child, fk, parent_key in self.reverse:
+            ids = {row[parent_key] for row in rows if row[parent_key] is not None}
+            grouped = related.setdefault(id(child), {})
+            child_rows = []
+            ids = list(ids)
+            for start in range(0, len(ids), CHUNK_SIZE):
+                chunk = child.model._default_manager.filter(**{f'{fk}__in': ids[start:start + CHUNK_SIZE]})
+                child_rows.extend(chunk.values(*(child.lookups | {fk})))
+            # Keep the related model's default ordering across chunks
+            for row in child_rows:
+                grouped.setdefault(row[fk], []).append(row)
+            child.fetch_related(child_rows, related)
+        for name, kind, key, child, _ in self.entries:
+            if kind == 'one':
+                child.fetch_related(rows, related)
+
+    def serialize(self, row, context, related):
+        proxy = self.build_proxy(row) if self.has_proxy else None
+        data = {}
+        for name, kind, key, convert, extra in self.entries:
+            if kind == 'value':
+                null_checks, missing = extra
+                if null_checks and any(row[check] is None for check in null_checks):
+                    if missing is None:
+                        continue
+                    data[name] = missing()
+                    continue
+                value = row[key]
+                data[name] = value if value is None or convert is None else convert(value)
+            elif kind == 'value_context':
+                null_checks, missing = extra
+                if null_checks and any(row[check] is None for check in null_checks):
+                    if missing is None:
+                        continue
+                    data[name] = missing()
+                    continue
+                value = row[key]
+                data[name] = None if value is None else convert(value, context)
+            elif kind == 'property':
+                value = getattr(proxy, key)
+                data[name] = value if value is None or convert is None else convert(value)
+            elif kind == 'one':
+                data[name] = None if row[key] is None else convert.serialize(row, context, related)
+            else:
+                children = related.get(id(convert), {}).get(row[key], [])
+                data[name] = [convert.serialize(child, context, related) for child in children]
+        return data
+
+
+class FastSerializer:
+    """Serialize querysets with a compiled plan of ``serializer_class``"""
+
+    def __init__(self, serializer_class, fields=None, exclude=None):
+        kwargs = {}
+        if fields is not None:
+            kwargs['fields'] = fields
+        if exclude is not None:
+            kwargs['exclude'] = exclude
+        serializer = serializer_class(**kwargs)
+        self.plan = Plan(serializer, serializer_class.Meta.model)
+
+    @classmethod
+    def for_serializer(cls, serializer_class, fields=None, exclude=None):
+        """Return a cached FastSerializer, or None when the serializer cannot be compiled"""
+        # ?fields= / ?exclude= come from clients: key the cache on the declared
+        # fields they actually drop, so equivalent query strings share a plan
+        excluded = ()
+        if fields or exclude:
+            excluded = tuple(sorted(
+                set(serializer_class.excluded_field_names(fields, exclude)) & set(serializer_class.Meta.fields)
+            ))
+        return cls._compile(serializer_class, excluded)
+
+    @classmethod
+    @functools.lru_cache(maxsize=PLAN_CACHE_SIZE)
+    def _compile(cls, serializer_class, excluded):
+        try:
+            return cls(serializer_class, exclude=list(excluded) if excluded else None)
+        except UnsupportedSerializer:
+            return None
+
+    def values(self, queryset, *extra):
+        """The queryset as values() rows carrying every column the plan reads"""
+        return queryset.prefetch_related(None).values(*(self.plan.lookups | set(extra)))
+
+    def serialize_rows(self, rows, context=None):
+        rows = list(rows)
+        related = {}
+        self.plan.fetch_related(rows, related)
+        context = {
+            'request': (context or {}).get('request'),
+            'timezone': timezone.get_current_timezone(),
+        }
+        return [self.plan.serialize(row, context, related) for row in rows]
+
+    def serialize(self, queryset, context=None):
+        return self.serialize_rows(self.values(queryset), context)
@@ -0,0 +1,184 @@
+"""
+Idempotency-Key support for endpoints that must not run twice.
+
+A client that may retry a request sends an ``Idempotency-Key`` header with a
+value unique to the operation. The first request with a given key runs the
+view and stores its response, rendered as JSON and compressed, for
+``IDEMPOTENCY_KEY_TTL`` seconds. Retries with the same key get the stored
+response back, with an ``Idempotent-Replayed: true`` header, and the view
+does not run again.
+
+Keys are claimed by inserting their row before the view runs, so concurrent
+duplicates are coalesced: whichever request inserts the row runs the view,
+and the others wait up to ``IDEMPOTENCY_WAIT_TIMEOUT`` seconds for its
+response (409 if it does not finish in time). Server errors are not stored;
+the key is freed so the client can retry.
+
+A claim is a lease of ``IDEMPOTENCY_PROCESSING_TIMEOUT`` seconds from its
+``created_at``. If the request holding it dies before storing a response
+(worker killed, timeout), a retry after the lease has run out takes the key
+over with a conditional UPDATE and runs the view itself. The original
+request, should it still finish, no longer stores or frees the key.
+
+By default the view runs in a transaction that also stores its response,
+holding a lock on the key's row: the view's writes and the stored response
+commit together, and a takeover waits for a live request instead of running
+the view a second time. Views that call external services pass
+``atomic=False`` so no transaction is held across the call, and make the
+call itself idempotent with ``request.idempotency_key``, a key derived from
+the header that is unique per user and endpoint and the same on every retry.
+
+Keys are scoped to the user and the endpoint. Reusing a key with a different
+request body is rejected with 422.
+"""
+import hashlib
+import json
+import time
+import zlib
+from contextlib import nullcontext
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils import encoders
+
+from .models import IdempotencyKey
+from .renderers import FastJSONRenderer
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+
+def _request_hash(request):
+    payload = json.dumps(request.data, sort_keys=True, cls=encoders.JSONEncoder)
+    return hashlib.sha256(f'{request.method} {request.path}\n{payload}'.encode()).hexdigest()
+
+
+def _claim(user, endpoint, key, request_hash):
+    """Insert the key's row; returns it when this request claimed the key, else None"""
+    now = timezone.now()
+    IdempotencyKey.objects.filter(user=user, endpoint=endpoint, key=key, expires_at__lte=now).delete()
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(
+                user=user,
+                endpoint=endpoint,
+                key=key,
+                request_hash=request_hash,
+                expires_at=now + timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL', 60 * 60 * 24)),
+            )
+    except IntegrityError:
+        return None
+
+
+def _take_over(record):
+    """Renew the lease of an abandoned claim; returns True when this request won it"""
+    now = timezone.now()
+    timeout = timedelta(seconds=getattr(settings, 'IDEMPOTENCY_PROCESSING_TIMEOUT', 60))
+    if record.created_at > now - timeout:
+        return False
+    # Only one request's UPDATE can still see the expired lease
+    taken = IdempotencyKey.objects.filter(
+        pk=record.pk, status_code__isnull=True, created_at=record.created_at
+    ).update(created_at=now)
+    record.created_at = now
+    return bool(taken)
+
+
+def _external_key(user, endpoint, key):
+    """A key for external services, unique per user, endpoint and Idempotency-Key"""
+    return hashlib.sha256(f'{user.pk}\n{endpoint}\n{key}'.encode()).hexdigest()
+
+
+def _error(message, status_code):
+    return Response({'success': False, 'message': message}, status=status_code)
+
+
+def _replay(record):
+    response = HttpResponse(
+        zlib.decompress(bytes(record.response_body)),
+        status=record.status_code,
+        content_type='application/json',
+    )
+    response[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def idempotent(endpoint, atomic=True):
+    """
+    Make a function view honour the Idempotency-Key header. Goes below
+    ``@api_view`` and ``@permission_classes``; the view must require an
+    authenticated user. With ``atomic`` the view runs in the transaction
+    that stores its response.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            key = request.headers.get(HEADER)
+            if key is None:
+                return view(request, *args, **kwargs)
+            if not key or len(key) > MAX_KEY_LENGTH:
+                return _error(f'{HEADER} must be 1 to {MAX_KEY_LENGTH} characters', status.HTTP_400_BAD_REQUEST)
+
+            request_hash = _request_hash(request)
+            request.idempotency_key = _external_key(request.user, endpoint, key)
+            deadline = time.monotonic() + getattr(settings, 'IDEMPOTENCY_WAIT_TIMEOUT', 10)
+            delay = 0.05
+            while True:
+                record = _claim(request.user, endpoint, key, request_hash)
+                if record is not None:
+                    return _run(view, record, atomic, request, *args, **kwargs)
+
+                # Someone else holds the key: replay its response once it has one
+                record = IdempotencyKey.objects.filter(
+                    user=request.user, endpoint=endpoint, key=key
+                ).only('request_hash', 'status_code', 'response_body', 'created_at').first()
+                if record is not None:
+                    if record.request_hash != request_hash:
+                        return _error(f'{HEADER} was already used for a different request',
+                                      status.HTTP_422_UNPROCESSABLE_ENTITY)
+                    if record.status_code is not None:
+                        return _replay(record)
+                    if _take_over(record):
+                        return _run(view, record, atomic, request, *args, **kwargs)
+                if time.monotonic() >= deadline:
+                    return _error(f'A request with this {HEADER} is still being processed',
+                                  status.HTTP_409_CONFLICT)
+                time.sleep(delay)
+                delay = min(delay * 2, 0.5)
+        return wrapper
+    return decorator
+
+
+def _run(view, record, atomic, request, *args, **kwargs):
+    # Only touch the row while this request still holds the lease
+    claim = IdempotencyKey.objects.filter(pk=record.pk, status_code__isnull=True, created_at=record.created_at)
+    try:
+        with transaction.atomic() if atomic else nullcontext():
+            if atomic and not list(claim.select_for_update().values_list('pk', flat=True)):
+                return _error(f'A request with this {HEADER} is still being processed',
+                              status.HTTP_409_CONFLICT)
+            response = view(request, *args, **kwargs)
+            if response.status_code < 500 and isinstance(response, Response):
+                body = FastJSONRenderer().render(response.data)
+                claim.update(status_code=response.status_code, response_body=zlib.compress(body))
+                return response
+            if atomic:
+                transaction.set_rollback(True)
+    except BaseException:
+        claim.delete()
+        raise
+    claim.delete()
+    return response
+
+
+def prune_expired():
+    """Delete expired keys. Returns the number deleted."""
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
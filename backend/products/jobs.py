@@ -0,0 +1,155 @@
+"""
+A small database-backed job queue for work that should not hold up a request.
+
+Tasks are plain functions registered under a name with ``@task``::
+
+    @task('send_order_confirmation')
+    def send_order_confirmation(order_id):
+        ...
+
+``enqueue(name, **kwargs)`` inserts a ``Job`` row in the caller's
+transaction, so a job queued during checkout only becomes visible once the
+order commits, and disappears with it on rollback. The ``run_jobs``
+management command runs them.
+
+A worker claims a due job with a conditional UPDATE on its status, so any
+number of workers can share the table without locks. A failed job is queued
+again after ``JOB_RETRY_BACKOFF * 2 ** (attempts - 1)`` seconds until it
+has run ``max_attempts`` times, then marked failed. A job left running by a
+worker that died is queued again after ``JOB_TIMEOUT`` seconds, so tasks
+should be safe to run more than once.
+"""
+import logging
+import socket
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+_tasks = {}
+
+
+def task(name):
+    """Register the decorated function as the task ``name``"""
+    def decorator(func):
+        _tasks[name] = func
+        return func
+    return decorator
+
+
+def enqueue(name, delay=0, max_attempts=None, **kwargs):
+    """Queue the task ``name`` to run with ``kwargs`` (JSON-serializable) after ``delay`` seconds"""
+    if name not in _tasks:
+        raise KeyError(f'Unknown task: {name}')
+    return Job.objects.create(
+        name=name,
+        payload=kwargs,
+        run_at=timezone.now() + timedelta(seconds=delay),
+        max_attempts=max_attempts or getattr(settings, 'JOB_MAX_ATTEMPTS', 5),
+    )
+
+
+def requeue_lost_jobs():
+    """Queue again jobs whose worker has not finished them within JOB_TIMEOUT"""
+    timeout = timedelta(seconds=getattr(settings, 'JOB_TIMEOUT', 10 * 60))
+    return Job.objects.filter(status='running', locked_at__lt=timezone.now() - timeout).update(
+        status='pending', locked_by='', locked_at=None, updated_at=timezone.now()
+    )
+
+
+def claim_job(worker):
+    """Claim the next due job for ``worker``; returns it, or None when nothing is due"""
+    due = Job.objects.filter(status='pending', run_at__lte=timezone.now()).order_by('run_at')
+    while True:
+        job = due.only('id').first()
+        if job is None:
+            return None
+        now = timezone.now()
+        # Only one worker's UPDATE can still see the job pending
+        claimed = Job.objects.filter(pk=job.pk, status='pending').update(
+            status='running', locked_by=worker, locked_at=now, attempts=F('attempts') + 1, updated_at=now
+        )
+        if claimed:
+            return Job.objects.get(pk=job.pk)
+
+
+def run_job(job):
+    """Run a claimed job and record the outcome"""
+    try:
+        func = _tasks[job.name]
+        func(**job.payload)
+    except Exception:
+        error = traceback.format_exc()
+        logger.exception('Job %s #%s failed (attempt %s of %s)', job.name, job.pk, job.attempts, job.max_attempts)
+        if job.attempts < job.max_attempts:
+            backoff = getattr(settings, 'JOB_RETRY_BACKOFF', 30) * 2 ** (job.attempts - 1)
+            updates = {'status': 'pending', 'run_at': timezone.now() + timedelta(seconds=backoff)}
+        else:
+            updates = {'status': 'failed'}
+        Job.objects.filter(pk=job.pk).update(
+            last_error=error, locked_by='', locked_at=None, updated_at=timezone.now(), **updates
+        )
+        return False
+    Job.objects.filter(pk=job.pk).update(
+        status='done', locked_by='', locked_at=None, updated_at=timezone.now()
+    )
+    return True
+
+
+class Worker:
+    """Runs due jobs on ``concurrency`` threads"""
+
+    def __init__(self, concurrency=None, poll_interval=1.0):
+        self.concurrency = concurrency or getattr(settings, 'JOB_WORKER_CONCURRENCY', 2)
+        self.poll_interval = poll_interval
+        self.name = f'{socket.gethostname()}:{threading.get_native_id()}'
+        self.stopping = threading.Event()
+        self.processed = 0
+        self.lock = threading.Lock()
+
+    def run(self, burst=False):
+        """Work until stop() is called, or until no job is due with ``burst``"""
+        requeue_lost_jobs()
+        threads = [
+            threading.Thread(target=self._loop, args=(f'{self.name}/{index}', burst), daemon=True)
+            for index in range(self.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(timeout=0.5)
+        except KeyboardInterrupt:
+            self.stop()
+            for thread in threads:
+                thread.join()
+        return self.processed
+
+    def stop(self):
+        self.stopping.set()
+
+    def _loop(self, worker, burst):
+        try:
+            while not self.stopping.is_set():
+                close_old_connections()
+                job = claim_job(worker)
+                if job is None:
+                    if burst:
+                        return
+                    requeue_lost_jobs()
+                    self.stopping.wait(self.poll_interval)
+                    continue
+                run_job(job)
+                with self.lock:
+                    self.processed += 1
+        finally:
+            connection.close()
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from products.models import OrderItem
+
+
+class Command(BaseCommand):
+    help = (
+        'Copy product names, images, SKUs and variant attributes onto order items created '
+        'before they were snapshotted at checkout, in small batches. Safe to run against live traffic.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Order items updated per batch')
+        parser.add_argument('--pause', type=float, default=0.05,
+                            help='Seconds to sleep between batches')
+
+    def handle(self, *args, **options):
+        updated = OrderItem.backfill_snapshots(chunk_size=options['chunk_size'], pause=options['pause'])
+        self.stdout.write(self.style.SUCCESS(f'Snapshotted {updated} order items'))
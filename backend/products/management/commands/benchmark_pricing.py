@@ -0,0 +1,71 @@
+import random
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from products.models import PricingRule
+from products.pricing import PricingEngine
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark bulk cart pricing throughput on randomly generated carts: '
+        'one engine per cart against one engine for the whole batch.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('sizes', nargs='*', type=int, default=[1_000, 10_000, 100_000],
+                            help='Number of carts to price')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Timed runs per mode')
+        parser.add_argument('--max-lines', type=int, default=8,
+                            help='Maximum number of lines per cart')
+
+    def handle(self, *args, **options):
+        # Default rules, so the benchmark needs no database
+        rules = PricingRule.DEFAULTS
+        self.stdout.write(
+            f'  {"carts":>10}{"per-cart p50":>15}{"batch p50":>13}{"carts/s":>12}{"lines/s":>13}'
+        )
+        for size in options['sizes']:
+            carts = self.build_carts(size, options['max_lines'])
+            lines = sum(len(cart) for cart in carts.values())
+
+            def per_cart():
+                return {key: PricingEngine(rules=rules).price_lines(cart) for key, cart in carts.items()}
+
+            def batch():
+                engine = PricingEngine(rules=rules)
+                return {key: engine.price_lines(cart) for key, cart in carts.items()}
+
+            if per_cart() != batch():
+                self.stderr.write(f'Batch and per-cart prices differ for {size:,} carts')
+            per_cart_time = self.time(per_cart, options['repeat'])
+            batch_time = self.time(batch, options['repeat'])
+            self.stdout.write(
+                f'  {size:>10,}{self.ms(per_cart_time):>15}{self.ms(batch_time):>13}'
+                f'{size / batch_time:>12,.0f}{lines / batch_time:>13,.0f}'
+            )
+
+    def build_carts(self, size, max_lines):
+        rng = random.Random(size)
+        return {
+            cart: [
+                (Decimal(rng.randrange(1000, 5_000_000)) / 100, rng.randint(1, 5))
+                for _ in range(rng.randint(1, max_lines))
+            ]
+            for cart in range(size)
+        }
+
+    def time(self, func, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - started)
+        return statistics.median(timings)
+
+    def ms(self, seconds):
+        return f'{seconds * 1000:.1f} ms'
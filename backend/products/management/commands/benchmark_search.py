@@ -0,0 +1,129 @@
+import random
+import sqlite3
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from products import search
+
+WORDS = [
+    'phone', 'laptop', 'camera', 'console', 'headphones', 'speaker', 'watch',
+    'charger', 'cable', 'case', 'wireless', 'bluetooth', 'pro', 'max', 'ultra',
+    'mini', 'gaming', 'portable', 'smart', 'digital', 'premium', 'classic',
+    'black', 'white', 'silver', 'blue', 'red', 'leather', 'cotton', 'steel',
+    'apple', 'samsung', 'sony', 'dell', 'lenovo', 'canon', 'nikon', 'xbox',
+]
+CATEGORIES = ['Phones', 'Laptops', 'Cameras', 'Gaming', 'Accessories', 'Audio', 'Wearables']
+SYLLABLES = ['ka', 'lo', 'mi', 'ne', 'ro', 'su', 'ta', 'vi', 'ze', 'qu', 'xo', 'ba', 'de', 'fi', 'go']
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark FTS5 product search against the old name__icontains scan. '
+        'Note that icontains only looks at names while FTS5 also searches '
+        'descriptions, categories and variant attributes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('sizes', nargs='*', type=int, default=[100_000, 1_000_000],
+                            help='Catalog sizes to benchmark')
+        parser.add_argument('--repeat', type=int, default=20,
+                            help='Timed runs per query')
+        parser.add_argument('--limit', type=int, default=20,
+                            help='Page size requested from each search')
+
+    def handle(self, *args, **options):
+        for size in options['sizes']:
+            self.stdout.write(self.style.SUCCESS(f'Catalog size: {size:,} products'))
+            db, queries = self.build_catalog(size)
+
+            like_sql = (
+                'SELECT id FROM products_product WHERE name LIKE ? '
+                'ORDER BY created_at DESC LIMIT ?'
+            )
+            fts_sql = (
+                f'SELECT rowid FROM {search.SEARCH_TABLE} WHERE {search.SEARCH_TABLE} MATCH ? '
+                f'ORDER BY {search.RANK_SQL} LIMIT ?'
+            )
+
+            self.stdout.write(f'  {"query":<22}{"icontains p50":>16}{"fts5 p50":>12}{"fts5 p95":>12}{"matches":>10}')
+            for query in queries:
+                like = self.time_query(db, like_sql, (f'%{query}%', options['limit']), options['repeat'])
+                match = search.build_match_query(query)
+                fts = self.time_query(db, fts_sql, (match, options['limit']), options['repeat'])
+                matches = db.execute(
+                    f'SELECT count(*) FROM {search.SEARCH_TABLE} WHERE {search.SEARCH_TABLE} MATCH ?', (match,)
+                ).fetchone()[0]
+                self.stdout.write(
+                    f'  {query:<22}{self.ms(like[0]):>16}{self.ms(fts[0]):>12}{self.ms(fts[1]):>12}{matches:>10,}'
+                )
+            db.close()
+
+    def build_catalog(self, size):
+        """
+        Build an in-memory catalog with a long-tailed vocabulary: a few common
+        words shared by many products plus model/brand tokens that are rare,
+        like a real catalog. Returns the connection and the queries to time.
+        """
+        rng = random.Random(size)
+        vocabulary = sorted({
+            ''.join(rng.choices(SYLLABLES, k=4)) for _ in range(max(1000, size // 20))
+        })
+        db = sqlite3.connect(':memory:')
+        db.execute(
+            'CREATE TABLE products_product ('
+            'id INTEGER PRIMARY KEY, name TEXT, description TEXT, category TEXT, created_at INTEGER)'
+        )
+        db.execute(search.CREATE_TABLE_SQL)
+
+        started = time.perf_counter()
+        batch = []
+        for product_id in range(1, size + 1):
+            name = ' '.join([rng.choice(WORDS)] + rng.choices(vocabulary, k=2))
+            description = ' '.join(rng.choices(WORDS, k=8) + rng.choices(vocabulary, k=4))
+            category = rng.choice(CATEGORIES)
+            attributes = ' '.join(rng.choices(WORDS[22:30], k=2))
+            batch.append((product_id, name, description, category, attributes))
+            if len(batch) == 10_000:
+                self.insert(db, batch)
+                batch = []
+        if batch:
+            self.insert(db, batch)
+        db.execute(f"INSERT INTO {search.SEARCH_TABLE} ({search.SEARCH_TABLE}) VALUES ('optimize')")
+        db.commit()
+        self.stdout.write(f'  built in {time.perf_counter() - started:.1f}s')
+
+        rare = rng.sample(vocabulary, 3)
+        queries = [
+            'phone',
+            'wireless speaker',
+            rare[0],
+            f'{rng.choice(WORDS)} {rare[1]}',
+            rare[2][:5],
+        ]
+        return db, queries
+
+    def insert(self, db, batch):
+        db.executemany(
+            'INSERT INTO products_product (id, name, description, category, created_at) VALUES (?, ?, ?, ?, ?)',
+            [(row[0], row[1], row[2], row[3], row[0]) for row in batch],
+        )
+        db.executemany(
+            f'INSERT INTO {search.SEARCH_TABLE} (rowid, name, description, category, attributes) '
+            'VALUES (?, ?, ?, ?, ?)',
+            batch,
+        )
+
+    def time_query(self, db, sql, params, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            db.execute(sql, params).fetchall()
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        return statistics.median(timings), p95
+
+    def ms(self, seconds):
+        return f'{seconds * 1000:.2f} ms'
@@ -0,0 +1,106 @@
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from rest_framework.renderers import JSONRenderer
+
+from products.fastserializers import FastSerializer
+from products.models import Category, Product, ProductVariant
+from products.renderers import FastJSONRenderer, orjson
+from products.serializers import ProductListSerializer, ProductSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark DRF serialization against the fast-path engine on a '
+        'throwaway test database, checking that both render the same bytes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('sizes', nargs='*', type=int, default=[1_000, 10_000, 100_000],
+                            help='Number of product rows to serialize')
+        parser.add_argument('--repeat', type=int, default=3,
+                            help='Timed runs per engine')
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stdout.write(self.style.WARNING('orjson is not installed; the fast renderer uses json.dumps'))
+
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.build_catalog(max(options['sizes']))
+            for size in options['sizes']:
+                self.stdout.write(self.style.SUCCESS(f'{size:,} rows'))
+                self.stdout.write(f'  {"serializer":<26}{"drf p50":>12}{"fast p50":>12}{"speedup":>10}')
+                for serializer_class in (ProductListSerializer, ProductSerializer):
+                    self.compare(serializer_class, size, options['repeat'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def build_catalog(self, size):
+        categories = Category.objects.bulk_create(
+            Category(name=f'Category {index}', image=f'categories/{index}.png') for index in range(20)
+        )
+        Product.objects.bulk_create((
+            Product(
+                name=f'Product {index}',
+                description='A reasonably long product description ' * 4,
+                category=categories[index % len(categories)],
+                price=Decimal('99.99') + index % 500,
+                old_price=Decimal('799.00') if index % 3 == 0 else None,
+                stock_quantity=index % 7,
+                image=f'products/{index}.jpg' if index % 4 else '',
+                rating=(index % 50) / 10,
+                reviews_count=index % 300,
+                has_variants=index % 10 == 0,
+            )
+            for index in range(size)
+        ), batch_size=2000)
+        product_ids = Product.objects.filter(has_variants=True).values_list('id', flat=True)
+        ProductVariant.objects.bulk_create((
+            ProductVariant(
+                product_id=product_id, sku=f'SKU-{product_id}-{size_name}', size=size_name,
+                color='Black', price_adjustment=Decimal('25.00'), stock_quantity=3,
+            )
+            for product_id in product_ids
+            for size_name in ('M', 'L')
+        ), batch_size=2000)
+        Product.refresh_variants_stock()
+
+    def compare(self, serializer_class, size, repeat):
+        queryset = Product.objects.select_related('category').order_by('id')[:size]
+        if serializer_class is ProductSerializer:
+            queryset = queryset.prefetch_related('variants')
+
+        def drf():
+            return JSONRenderer().render(serializer_class(queryset.all(), many=True).data)
+
+        fast_serializer = FastSerializer.for_serializer(serializer_class)
+        if fast_serializer is None:
+            raise CommandError(f'{serializer_class.__name__} cannot be compiled')
+
+        def fast():
+            return FastJSONRenderer().render(fast_serializer.serialize(queryset.all()))
+
+        drf_time, drf_output = self.time(drf, repeat)
+        fast_time, fast_output = self.time(fast, repeat)
+        if drf_output != fast_output:
+            raise CommandError(f'{serializer_class.__name__}: outputs differ')
+        self.stdout.write(
+            f'  {serializer_class.__name__:<26}{self.ms(drf_time):>12}{self.ms(fast_time):>12}'
+            f'{drf_time / fast_time:>9.1f}x'
+        )
+
+    def time(self, func, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            output = func()
+            timings.append(time.perf_counter() - started)
+        return statistics.median(timings), output
+
+    def ms(self, seconds):
+        return f'{seconds * 1000:.0f} ms'
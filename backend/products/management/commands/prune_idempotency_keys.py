@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from products.idempotency import prune_expired
+
+
+class Command(BaseCommand):
+    help = 'Delete stored Idempotency-Key responses older than IDEMPOTENCY_KEY_TTL'
+
+    def handle(self, *args, **options):
+        deleted = prune_expired()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} idempotency keys'))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from products import reporting
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute the daily product and category sales rollups from the order history, '
+        'streaming orders in batches. On a live site, rebuild past days only (--until).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', default=None, help='First day to rebuild (YYYY-MM-DD, default: all history)')
+        parser.add_argument('--until', default=None, help='Last day to rebuild (YYYY-MM-DD, default: all history)')
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Orders read per batch')
+        parser.add_argument('--pause', type=float, default=0,
+                            help='Seconds to sleep between batches')
+
+    def handle(self, *args, **options):
+        dates = {}
+        for option in ('since', 'until'):
+            value = options[option]
+            dates[option] = parse_date(value) if value else None
+            if value and dates[option] is None:
+                raise CommandError(f'--{option} must be in YYYY-MM-DD format')
+        counted = reporting.rebuild(
+            since=dates['since'],
+            until=dates['until'],
+            chunk_size=options['chunk_size'],
+            pause=options['pause'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt sales rollups from {counted} orders'))
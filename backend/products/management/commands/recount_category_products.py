@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from products.models import Category
+
+
+class Command(BaseCommand):
+    help = 'Recompute the cached active product count of every category'
+
+    def handle(self, *args, **options):
+        updated = Category.recount_products()
+        self.stdout.write(self.style.SUCCESS(f'Recounted products for {updated} categories'))
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from products.reservations import release_expired
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete expired stock reservations in bulk. Expired holds are already '
+        'ignored, so this only keeps the table small; use --every to run periodically.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Reservations deleted per batch')
+        parser.add_argument('--every', type=int, default=None,
+                            help='Keep running, releasing every this many seconds')
+
+    def handle(self, *args, **options):
+        while True:
+            deleted = release_expired(chunk_size=options['chunk_size'])
+            self.stdout.write(self.style.SUCCESS(f'Released {deleted} expired reservations'))
+            if not options['every']:
+                break
+            time.sleep(options['every'])
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from products.jobs import Worker
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs until interrupted'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=None,
+                            help='Jobs run at once (default: JOB_WORKER_CONCURRENCY)')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to wait when no job is due')
+        parser.add_argument('--burst', action='store_true',
+                            help='Exit once no job is due')
+
+    def handle(self, *args, **options):
+        worker = Worker(concurrency=options['concurrency'], poll_interval=options['poll_interval'])
+        self.stdout.write(f'Worker {worker.name} running {worker.concurrency} jobs at once')
+        processed = worker.run(burst=options['burst'])
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} jobs'))
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from products.cart import sweep_stale_carts
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete carts with no change in CART_RETENTION_DAYS, in small batches. '
+        'Safe to run against live traffic; use --every to keep sweeping periodically.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='Retention in days (default: CART_RETENTION_DAYS)')
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Cart lines read per batch')
+        parser.add_argument('--pause', type=float, default=0.05,
+                            help='Seconds to sleep between batches')
+        parser.add_argument('--every', type=int, default=None,
+                            help='Keep running, sweeping every this many seconds')
+
+    def handle(self, *args, **options):
+        while True:
+            carts, lines = sweep_stale_carts(
+                retention_days=options['days'],
+                chunk_size=options['chunk_size'],
+                pause=options['pause'],
+            )
+            self.stdout.write(self.style.SUCCESS(f'Deleted {carts} stale carts ({lines} items)'))
+            if not options['every']:
+                break
+            time.sleep(options['every'])
@@ -0,0 +1,39 @@
+from django.db import migrations
+
+SEARCH_TABLE = 'products_productsearch'
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        f'CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5('
+        "name, description, category, attributes, tokenize = 'unicode61 remove_diacritics 2')"
+    )
+    schema_editor.execute(
+        f'INSERT INTO {SEARCH_TABLE} (rowid, name, description, category, attributes) '
+        'SELECT p.id, p.name, p.description, c.name, COALESCE(('
+        "  SELECT group_concat(trim(coalesce(v.sku, '') || ' ' || coalesce(v.size, '') || ' ' || "
+        "  coalesce(v.color, '') || ' ' || coalesce(v.material, '')), ' ') "
+        "  FROM products_productvariant v WHERE v.product_id = p.id AND v.is_active"
+        "), '') "
+        'FROM products_product p JOIN products_category c ON c.id = p.category_id '
+        'WHERE p.is_active'
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_product_keyset_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
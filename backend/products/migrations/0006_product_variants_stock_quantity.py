@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:08
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def populate_variants_stock_quantity(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    ProductVariant = apps.get_model('products', 'ProductVariant')
+    variants_stock = ProductVariant.objects.filter(
+        product=OuterRef('pk')
+    ).order_by().values('product').annotate(total=Sum('stock_quantity')).values('total')
+    Product.objects.update(variants_stock_quantity=Coalesce(Subquery(variants_stock), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_category_products_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='variants_stock_quantity',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_variants_stock_quantity, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:26
+
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def create_default_rules(apps, schema_editor):
+    PricingRule = apps.get_model('products', 'PricingRule')
+    for name, value in [
+        ('tax_rate', Decimal('0.18')),
+        ('free_shipping_threshold', Decimal('500.00')),
+        ('shipping_cost', Decimal('50.00')),
+    ]:
+        PricingRule.objects.get_or_create(name=name, defaults={'value': value})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_catalog_sync'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PricingRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(choices=[('tax_rate', 'Tax rate'), ('free_shipping_threshold', 'Free shipping threshold'), ('shipping_cost', 'Shipping cost')], max_length=50, unique=True)),
+                ('value', models.DecimalField(decimal_places=4, max_digits=10)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.RunPython(create_default_rules, migrations.RunPython.noop),
+    ]
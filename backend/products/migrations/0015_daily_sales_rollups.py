@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:42
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+# The rollup tables start empty and count orders placed from now on. Run
+# `manage.py rebuild_sales_rollups` once after migrating to count the
+# existing orders; until then they are not subtracted when cancelled either.
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0014_order_item_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='recorded_sales',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='DailyCategorySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('orders_count', models.PositiveIntegerField(default=0)),
+                ('units_sold', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='products.category')),
+            ],
+            options={
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['category', 'date'], name='categorysales_cat_date_idx')],
+                'unique_together': {('date', 'category')},
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyProductSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('orders_count', models.PositiveIntegerField(default=0)),
+                ('units_sold', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='products.product')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_product_sales', to='products.category')),
+            ],
+            options={
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['product', 'date'], name='productsales_product_date_idx'), models.Index(fields=['category', 'date'], name='productsales_cat_date_idx')],
+                'unique_together': {('date', 'product', 'category')},
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:51
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def delete_duplicate_lines(apps, schema_editor):
+    CartItem = apps.get_model('products', 'CartItem')
+    duplicates = (
+        CartItem.objects.filter(variant__isnull=True)
+        .order_by().values('user', 'product')
+        .annotate(keep=Min('id'), lines=models.Count('id'))
+        .filter(lines__gt=1)
+    )
+    for duplicate in duplicates:
+        CartItem.objects.filter(
+            user_id=duplicate['user'], product_id=duplicate['product'], variant__isnull=True
+        ).exclude(id=duplicate['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0015_daily_sales_rollups'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_lines, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(condition=models.Q(('variant__isnull', True)), fields=('user', 'product'), name='cartitem_user_product_no_variant'),
+        ),
+    ]
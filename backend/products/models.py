@@ -1,23 +1,59 @@
+import time
+
 from django.db import models
+from django.db.models.functions import Coalesce, Now
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
 from decimal import Decimal
 
+from .caching import invalidate_order
+
+def _exclude_from_update(instance, save_kwargs, *excluded):
+    """Restrict an UPDATE issued by save() to every concrete field except ``excluded``"""
+    if instance._state.adding or 'update_fields' in save_kwargs or save_kwargs.get('force_insert'):
+        return
+    save_kwargs['update_fields'] = [
+        field.name for field in instance._meta.concrete_fields
+        if not field.primary_key and field.name not in excluded
+    ]
+
 class Category(models.Model):
     name = models.CharField(max_length=100, unique=True)
     description = models.TextField(blank=True)
     image = models.ImageField(upload_to='categories/', blank=True, null=True)
     is_active = models.BooleanField(default=True)
+    # Number of active products, maintained by products.signals
+    products_count = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name_plural = "Categories"
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['updated_at'], name='category_updated_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # products_count is maintained with atomic UPDATEs; never write back
+        # the possibly stale copy loaded on this instance.
+        _exclude_from_update(self, kwargs, 'products_count')
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def recount_products(cls):
+        """Recompute products_count for every category in a single UPDATE"""
+        active_products = Product.objects.filter(
+            category=models.OuterRef('pk'), is_active=True
+        ).order_by().values('category').annotate(total=models.Count('id')).values('total')
+        return cls.objects.update(
+            products_count=Coalesce(models.Subquery(active_products), 0),
+            updated_at=Now(),
+        )
+
 class Product(models.Model):
     name = models.CharField(max_length=200)
     description = models.TextField()
@@ -32,15 +68,49 @@ class Product(models.Model):
     is_featured = models.BooleanField(default=False)
     # Product variant support
     has_variants = models.BooleanField(default=False)
+    # Total stock across all variants, maintained by products.signals
+    variants_stock_quantity = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination order for the product list
+            models.Index(fields=['-created_at', 'id'], name='product_created_id_idx'),
+            # Delta sync scans rows changed since a watermark
+            models.Index(fields=['updated_at', 'id'], name='product_updated_id_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # variants_stock_quantity is maintained with atomic UPDATEs
+        _exclude_from_update(self, kwargs, 'variants_stock_quantity')
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def in_stock_filter(cls):
+        return (
+            models.Q(has_variants=False, stock_quantity__gt=0) |
+            models.Q(has_variants=True, variants_stock_quantity__gt=0)
+        )
+
+    @classmethod
+    def refresh_variants_stock(cls, product_ids=None):
+        """Recompute variants_stock_quantity from the variant rows in a single UPDATE"""
+        variants_stock = ProductVariant.objects.filter(
+            product=models.OuterRef('pk')
+        ).order_by().values('product').annotate(total=models.Sum('stock_quantity')).values('total')
+        queryset = cls.objects.all()
+        if product_ids is not None:
+            queryset = queryset.filter(pk__in=product_ids)
+        return queryset.update(
+            variants_stock_quantity=Coalesce(models.Subquery(variants_stock), 0),
+            updated_at=Now(),
+        )
+
     @property
     def is_on_sale(self):
         return self.old_price and self.old_price > self.price
@@ -54,7 +124,7 @@ class Product(models.Model):
     @property
     def is_in_stock(self):
         if self.has_variants:
-            return any(variant.stock_quantity > 0 for variant in self.variants.all())
+            return self.variants_stock_quantity > 0
         return self.stock_quantity > 0
 
 class ProductVariant(models.Model):
@@ -77,6 +147,9 @@ class ProductVariant(models.Model):
     class Meta:
         unique_together = ('product', 'size', 'color', 'material')
         ordering = ['size', 'color']
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='variant_updated_id_idx'),
+        ]
 
     def __str__(self):
         variant_attrs = []
@@ -114,6 +187,24 @@ class ProductVariant(models.Model):
         
         super().save(*args, **kwargs)
 
+class CatalogTombstone(models.Model):
+    """Record of a deleted catalog row, so delta sync clients can drop it"""
+    MODEL_CHOICES = [
+        ('category', 'Category'),
+        ('product', 'Product'),
+        ('variant', 'Product Variant'),
+    ]
+
+    model_name = models.CharField(max_length=20, choices=MODEL_CHOICES)
+    object_id = models.PositiveBigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['deleted_at']
+
+    def __str__(self):
+        return f"{self.model_name} {self.object_id} deleted at {self.deleted_at}"
+
 class CartItem(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='cart_items')
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
@@ -125,6 +216,16 @@ class CartItem(models.Model):
     class Meta:
         unique_together = ('user', 'product', 'variant')
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='cartitem_updated_id_idx'),
+        ]
+        constraints = [
+            # NULL variants never collide in unique_together
+            models.UniqueConstraint(
+                fields=['user', 'product'], condition=models.Q(variant__isnull=True),
+                name='cartitem_user_product_no_variant',
+            ),
+        ]
 
     def __str__(self):
         variant_info = f" ({self.variant})" if self.variant else ""
@@ -156,6 +257,23 @@ class CartItem(models.Model):
     def is_out_of_stock(self):
         return self.available_stock <= 0
 
+class StockReservation(models.Model):
+    """Stock held for a cart line until expires_at (see products/reservations.py)"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='stock_reservations')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    variant = models.ForeignKey(ProductVariant, on_delete=models.CASCADE, blank=True, null=True)
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('user', 'product', 'variant')
+        indexes = [
+            models.Index(fields=['expires_at'], name='reservation_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} holds {self.quantity} of {self.product_id}/{self.variant_id} until {self.expires_at}"
+
 class Order(models.Model):
     ORDER_STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -204,8 +322,15 @@ class Order(models.Model):
     shipped_at = models.DateTimeField(blank=True, null=True)
     delivered_at = models.DateTimeField(blank=True, null=True)
 
+    # Sales this order last added to the daily rollups, null when none (see products/reporting.py)
+    recorded_sales = models.JSONField(blank=True, null=True, editable=False)
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Order history is paged on (-created_at, id) per user
+            models.Index(fields=['user', '-created_at', 'id'], name='order_user_created_id_idx'),
+        ]
 
     def __str__(self):
         return f"Order {self.order_number} - {self.user.username}"
@@ -214,22 +339,75 @@ class Order(models.Model):
         if not self.order_number:
             import uuid
             self.order_number = f"ORD-{uuid.uuid4().hex[:8].upper()}"
+        # recorded_sales is maintained by products.reporting
+        _exclude_from_update(self, kwargs, 'recorded_sales')
         super().save(*args, **kwargs)
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    variant = models.ForeignKey(ProductVariant, on_delete=models.SET_NULL, blank=True, null=True)
     quantity = models.PositiveIntegerField(validators=[MinValueValidator(1)])
     price = models.DecimalField(max_digits=10, decimal_places=2)  # Price at time of order
     total = models.DecimalField(max_digits=10, decimal_places=2)
+    # Product details at time of order, so order history never reads the catalog
+    product_name = models.CharField(max_length=200, blank=True)
+    product_image = models.ImageField(upload_to='products/', blank=True)
+    sku = models.CharField(max_length=100, blank=True)
+    variant_attributes = models.JSONField(default=dict, blank=True)
 
     def __str__(self):
-        return f"{self.order.order_number} - {self.product.name} (x{self.quantity})"
+        return f"{self.order.order_number} - {self.product_name} (x{self.quantity})"
 
     def save(self, *args, **kwargs):
         self.total = self.quantity * self.price
+        # Items added outside checkout (e.g. the admin) are snapshotted here
+        if not self.product_name:
+            self.take_snapshot()
         super().save(*args, **kwargs)
 
+    def take_snapshot(self):
+        """Copy the name, image, SKU and variant attributes from the product and variant"""
+        product, variant = self.product, self.variant
+        self.product_name = product.name
+        self.product_image = (variant and variant.image) or product.image or ''
+        self.sku = variant.sku if variant else ''
+        self.variant_attributes = {
+            attr: getattr(variant, attr)
+            for attr in ('size', 'color', 'material') if variant and getattr(variant, attr)
+        }
+
+    @classmethod
+    def backfill_snapshots(cls, chunk_size=500, pause=0):
+        """
+        Take the snapshot of items created before snapshots existed,
+        ``chunk_size`` rows per short UPDATE. Returns the number updated.
+        """
+        pending = (
+            cls.objects.filter(product_name='')
+            .select_related('product', 'variant')
+            .order_by('id')
+        )
+        updated = 0
+        last_id = 0
+        while True:
+            items = list(pending.filter(id__gt=last_id)[:chunk_size])
+            if not items:
+                return updated
+            for item in items:
+                item.take_snapshot()
+            updated += cls.objects.bulk_update(
+                items, ['product_name', 'product_image', 'sku', 'variant_attributes']
+            )
+            # bulk_update() sends no signals
+            for order_id in {item.order_id for item in items}:
+                invalidate_order(order_id)
+            last_id = items[-1].id
+            if len(items) < chunk_size:
+                return updated
+            if pause:
+                time.sleep(pause)
+
 class Payment(models.Model):
     PAYMENT_METHOD_CHOICES = [
         ('stripe', 'Stripe'),
@@ -309,18 +487,43 @@ class Coupon(models.Model):
                 (not self.usage_limit or self.used_count < self.usage_limit))
 
     def calculate_discount(self, order_amount):
-        if not self.is_valid() or order_amount < self.minimum_order_amount:
-            return Decimal('0.00')
-
-        if self.discount_type == 'percentage':
-            discount = (order_amount * self.discount_value) / 100
-        else:
-            discount = self.discount_value
+        from .pricing import PricingEngine, from_paise, to_paise
+        return from_paise(PricingEngine(coupon=self).discount(to_paise(order_amount)))
+
+    def redeem(self):
+        """Count one use in a single UPDATE; returns False, counting nothing, once the usage limit is reached"""
+        updated = Coupon.objects.filter(
+            models.Q(usage_limit__isnull=True) | models.Q(usage_limit=0)
+            | models.Q(used_count__lt=models.F('usage_limit')),
+            pk=self.pk,
+        ).update(used_count=models.F('used_count') + 1, updated_at=Now())
+        return bool(updated)
+
+class PricingRule(models.Model):
+    """A pricing parameter used by products.pricing, e.g. the tax rate"""
+    TAX_RATE = 'tax_rate'
+    FREE_SHIPPING_THRESHOLD = 'free_shipping_threshold'
+    SHIPPING_COST = 'shipping_cost'
+    NAME_CHOICES = [
+        (TAX_RATE, 'Tax rate'),
+        (FREE_SHIPPING_THRESHOLD, 'Free shipping threshold'),
+        (SHIPPING_COST, 'Shipping cost'),
+    ]
+    DEFAULTS = {
+        TAX_RATE: Decimal('0.18'),  # 18% GST
+        FREE_SHIPPING_THRESHOLD: Decimal('500.00'),  # Free shipping above ₹500
+        SHIPPING_COST: Decimal('50.00'),
+    }
+
+    name = models.CharField(max_length=50, choices=NAME_CHOICES, unique=True)
+    value = models.DecimalField(max_digits=10, decimal_places=4)
+    updated_at = models.DateTimeField(auto_now=True)
 
-        if self.maximum_discount_amount and discount > self.maximum_discount_amount:
-            discount = self.maximum_discount_amount
+    class Meta:
+        ordering = ['name']
 
-        return discount
+    def __str__(self):
+        return f"{self.get_name_display()}: {self.value}"
 
 class CouponUsage(models.Model):
     """Track coupon usage by users"""
@@ -348,3 +551,93 @@ class Wishlist(models.Model):
 
     def __str__(self):
         return f"{self.user.username} - {self.product.name}"
+
+class IdempotencyKey(models.Model):
+    """First response to a request sent with an Idempotency-Key header (see products/idempotency.py)"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys')
+    endpoint = models.CharField(max_length=50)
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    # Null while the first request is still running
+    status_code = models.PositiveSmallIntegerField(blank=True, null=True)
+    response_body = models.BinaryField(blank=True, null=True)  # zlib-compressed JSON
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('user', 'endpoint', 'key')
+        indexes = [
+            models.Index(fields=['expires_at'], name='idempotency_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.endpoint} {self.key} ({self.status_code or 'in flight'})"
+
+class Job(models.Model):
+    """Background task queued for the run_jobs worker (see products/jobs.py)"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_at = models.DateTimeField()
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['run_at']
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='job_status_run_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+class DailyProductSales(models.Model):
+    """Sales of a product per day and category it was in, kept up to date by products.reporting"""
+    date = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_sales')
+    # The product's category when the sales were recorded, as in DailyCategorySales
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='daily_product_sales')
+    orders_count = models.PositiveIntegerField(default=0)
+    units_sold = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+
+    class Meta:
+        unique_together = ('date', 'product', 'category')
+        ordering = ['-date']
+        indexes = [
+            models.Index(fields=['product', 'date'], name='productsales_product_date_idx'),
+            models.Index(fields=['category', 'date'], name='productsales_cat_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} - {self.product_id}: {self.units_sold} units"
+
+class DailyCategorySales(models.Model):
+    """Sales of a category per day, kept up to date by products.reporting"""
+    date = models.DateField()
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='daily_sales')
+    orders_count = models.PositiveIntegerField(default=0)
+    units_sold = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+
+    class Meta:
+        unique_together = ('date', 'category')
+        ordering = ['-date']
+        indexes = [
+            models.Index(fields=['category', 'date'], name='categorysales_cat_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} - {self.category_id}: {self.units_sold} units"
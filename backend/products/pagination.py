@@ -0,0 +1,147 @@
+import base64
+from collections.abc import Mapping
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination keyed on (-created_at, id).
+
+    Each page is fetched with a range predicate on the composite key instead of
+    an OFFSET, so the cost of a page does not grow with its depth.
+    """
+    page_size = 20
+    max_page_size = 100
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by('-created_at', 'id')
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            created_at, pk = cursor
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__gt=pk)
+            )
+
+        # Fetch one extra row to know whether a next page exists.
+        results = list(queryset[:page_size + 1])
+        self.has_next = len(results) > page_size
+        self.page = results[:page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        return self.bound_page_size(request.query_params.get(self.page_size_query_param))
+
+    def bound_page_size(self, value):
+        try:
+            page_size = int(value)
+        except (TypeError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(last))
+
+    def encode_cursor(self, instance):
+        # Pages may hold model instances or values() rows
+        if isinstance(instance, Mapping):
+            created_at, pk = instance['created_at'], instance['id']
+        else:
+            created_at, pk = instance.created_at, instance.pk
+        raw = f'{created_at.isoformat()}|{pk}'
+        return base64.urlsafe_b64encode(raw.encode('ascii')).decode('ascii')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(encoded.encode('ascii')).decode('ascii')
+            created_at, pk = raw.rsplit('|', 1)
+            return datetime.fromisoformat(created_at), int(pk)
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+
+class SearchResultsPagination(KeysetPagination):
+    """
+    Pagination for relevance-ranked search results.
+
+    Search results are ordered by rank rather than by the keyset, and users
+    rarely page far into them, so the cursor holds an offset into the ranked
+    matches. The envelope, page size parameter and cursor parameter are the
+    product list's, so the list has one response shape with or without
+    ?search=, and, as on the keyset, one extra row tells whether a next page
+    exists instead of a COUNT query. ?limit= and ?offset= are still accepted.
+    """
+    legacy_page_size_query_param = 'limit'
+    legacy_offset_query_param = 'offset'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        self.offset = self.decode_cursor(request)
+        results = list(queryset[self.offset:self.offset + page_size + 1])
+        self.has_next = len(results) > page_size
+        self.page = results[:page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        params = request.query_params
+        return self.bound_page_size(
+            params.get(self.page_size_query_param, params.get(self.legacy_page_size_query_param))
+        )
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), self.legacy_offset_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.offset + len(self.page)))
+
+    def encode_cursor(self, offset):
+        return base64.urlsafe_b64encode(f'offset|{offset}'.encode('ascii')).decode('ascii')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        try:
+            if not encoded:
+                return max(int(request.query_params.get(self.legacy_offset_query_param, 0)), 0)
+            kind, offset = base64.urlsafe_b64decode(encoded.encode('ascii')).decode('ascii').split('|')
+            if kind != 'offset' or int(offset) < 0:
+                raise ValueError(offset)
+            return int(offset)
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
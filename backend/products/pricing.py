@@ -0,0 +1,197 @@
+"""
+Cart and order pricing.
+
+Every price shown or charged goes through ``PricingEngine``: subtotal, coupon
+discount, tax, shipping and total. The tax rate, free-shipping threshold and
+shipping cost come from the ``PricingRule`` table, which is read once and kept
+in the cache until a rule changes (see ``products.signals``) or for
+``PRICING_RULES_CACHE_TIMEOUT`` seconds, so workers whose cache did not see
+the change stop using the old rules within that time.
+
+Amounts are computed in integer paise. Every derived amount (percentage
+discount, tax) is rounded half up to the paisa once, so a cart priced alone
+and the same cart priced in a batch always agree to the paisa.
+
+``price_carts`` prices any number of carts with the same rules and coupon,
+for promo simulations; ``price_user_carts`` reprices the stored carts of many
+users with one grouped query per chunk.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, DecimalField, F, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import CartItem, PricingRule
+
+RULES_CACHE_KEY = 'pricing:rules'
+
+
+def to_paise(amount):
+    return int((Decimal(amount) * 100).to_integral_value(ROUND_HALF_UP))
+
+
+def from_paise(paise):
+    return Decimal(paise).scaleb(-2)
+
+
+def _rate(value):
+    """A decimal rate as an exact (numerator, denominator) pair"""
+    return Decimal(value).as_integer_ratio()
+
+
+def _apply_rate(paise, rate):
+    """``paise * rate`` rounded half up to the paisa"""
+    numerator, denominator = rate
+    product = paise * numerator
+    if product >= 0:
+        return (2 * product + denominator) // (2 * denominator)
+    return -((-2 * product + denominator) // (2 * denominator))
+
+
+def unit_price_expression(prefix=''):
+    """SQL for ``CartItem.unit_price``: the product price plus the variant's adjustment"""
+    # Cart variants always belong to the line's product, so the product price
+    # is the same as the variant's product price.
+    return F(f'{prefix}product__price') + Coalesce(
+        F(f'{prefix}variant__price_adjustment'), Value(Decimal('0.00')),
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+
+
+def line_total_expression(prefix=''):
+    """SQL for ``CartItem.total_price``"""
+    return F(f'{prefix}quantity') * unit_price_expression(prefix)
+
+
+def get_rules():
+    """Return the pricing rules as ``{name: Decimal}``, read once and cached for a while"""
+    rules = cache.get(RULES_CACHE_KEY)
+    if rules is None:
+        rules = dict(PricingRule.DEFAULTS)
+        rules.update(PricingRule.objects.values_list('name', 'value'))
+        cache.set(RULES_CACHE_KEY, rules, timeout=getattr(settings, 'PRICING_RULES_CACHE_TIMEOUT', 300))
+    return rules
+
+
+def clear_rules_cache():
+    cache.delete(RULES_CACHE_KEY)
+
+
+class Quote(NamedTuple):
+    items_count: int
+    subtotal: Decimal
+    discount_amount: Decimal
+    tax_amount: Decimal
+    shipping_cost: Decimal
+    total: Decimal
+
+    def as_summary(self):
+        """The cart summary payload of the cart endpoints"""
+        return {
+            'items_count': self.items_count,
+            'subtotal': str(self.subtotal),
+            'tax_amount': str(self.tax_amount),
+            'shipping_cost': str(self.shipping_cost),
+            'total': str(self.total)
+        }
+
+
+class PricingEngine:
+    """Prices carts with one set of rules and an optional coupon"""
+
+    def __init__(self, rules=None, coupon=None):
+        rules = rules or get_rules()
+        self.tax_rate = _rate(rules[PricingRule.TAX_RATE])
+        self.free_shipping_threshold = to_paise(rules[PricingRule.FREE_SHIPPING_THRESHOLD])
+        self.shipping_cost = to_paise(rules[PricingRule.SHIPPING_COST])
+
+        # Coupon validity does not depend on the cart, so check it once
+        self.coupon = coupon if coupon is not None and coupon.is_valid() else None
+        if self.coupon is not None:
+            self.coupon_minimum = to_paise(coupon.minimum_order_amount)
+            self.coupon_maximum = (
+                to_paise(coupon.maximum_discount_amount) if coupon.maximum_discount_amount else None
+            )
+            if coupon.discount_type == 'percentage':
+                self.coupon_rate = _rate(Decimal(coupon.discount_value) / 100)
+                self.coupon_amount = None
+            else:
+                self.coupon_rate = None
+                self.coupon_amount = to_paise(coupon.discount_value)
+
+    def discount(self, subtotal):
+        """Coupon discount in paise for a subtotal in paise"""
+        if self.coupon is None or subtotal < self.coupon_minimum:
+            return 0
+        if self.coupon_rate is not None:
+            discount = _apply_rate(subtotal, self.coupon_rate)
+        else:
+            discount = self.coupon_amount
+        if self.coupon_maximum is not None:
+            discount = min(discount, self.coupon_maximum)
+        return min(discount, subtotal)
+
+    def quote(self, subtotal, items_count=0):
+        """Price a cart from its subtotal in paise"""
+        discount = self.discount(subtotal)
+        discounted_subtotal = subtotal - discount
+        tax = _apply_rate(discounted_subtotal, self.tax_rate)
+        shipping = self.shipping_cost if discounted_subtotal < self.free_shipping_threshold else 0
+        return Quote(
+            items_count,
+            from_paise(subtotal),
+            from_paise(discount),
+            from_paise(tax),
+            from_paise(shipping),
+            from_paise(discounted_subtotal + tax + shipping),
+        )
+
+    def price_lines(self, lines):
+        """Price a cart given as ``(unit_price, quantity)`` pairs of Decimals and ints"""
+        subtotal = 0
+        count = 0
+        for unit_price, quantity in lines:
+            subtotal += int((unit_price * 100).to_integral_value(ROUND_HALF_UP)) * quantity
+            count += 1
+        return self.quote(subtotal, count)
+
+
+def price_cart(lines, coupon=None):
+    """Price one cart given as ``(unit_price, quantity)`` pairs"""
+    return PricingEngine(coupon=coupon).price_lines(lines)
+
+
+def price_carts(carts, coupon=None):
+    """Price many carts, ``{key: [(unit_price, quantity), ...]}``, with the same rules"""
+    engine = PricingEngine(coupon=coupon)
+    return {key: engine.price_lines(lines) for key, lines in carts.items()}
+
+
+def price_user_carts(user_ids=None, coupon=None, chunk_size=1000):
+    """
+    Reprice the stored carts of ``user_ids`` (every user with a cart when
+    None), as ``{user_id: Quote}``. Each chunk of users is priced with one
+    grouped aggregate query.
+    """
+    engine = PricingEngine(coupon=coupon)
+    queryset = CartItem.objects.order_by()
+    if user_ids is None:
+        user_ids = queryset.values_list('user_id', flat=True).distinct()
+    user_ids = list(user_ids)
+
+    quotes = {}
+    for start in range(0, len(user_ids), chunk_size):
+        totals = (
+            queryset.filter(user_id__in=user_ids[start:start + chunk_size])
+            .values('user_id')
+            .annotate(
+                items_count=Count('id'),
+                subtotal=Sum(line_total_expression(), output_field=DecimalField(max_digits=12, decimal_places=2)),
+            )
+        )
+        for row in totals:
+            quotes[row['user_id']] = engine.quote(to_paise(row['subtotal']), row['items_count'])
+    return quotes
@@ -0,0 +1,302 @@
+"""
+Daily sales rollups for reporting.
+
+``DailyProductSales`` and ``DailyCategorySales`` hold, for every day, the
+orders, units and revenue of each product and category, so sales reports read
+a few rows per day instead of scanning orders. Revenue is the sum of order
+line totals, before coupon discounts, tax and shipping. Cancelled orders do
+not count. A sale is dated on the local day the order was placed and counts
+towards the category its product was in when it was recorded; product rows
+keep that category too, so product and category reports agree after a
+product moves.
+
+Each order keeps the sales it last added to the rollups in
+``Order.recorded_sales``. Whenever an order or one of its items is saved or
+deleted, ``refresh_order`` runs once the change commits: it takes the
+recorded sales out and puts the order's current sales in, so rollups follow
+status changes and item edits made anywhere (checkout, the admin, scripts),
+and only what was added is ever subtracted. A refresh is a fixed number of
+statements: per table an INSERT that ignores existing rows and one UPDATE
+adding the deltas, so concurrent orders never overwrite each other's counts.
+
+``rebuild`` recomputes the tables from the order history, streaming orders in
+``created_at`` order a chunk at a time, replacing each day's rows once the
+day is complete and resetting the orders' recorded sales. The tables start
+empty, so run it once, with the ``rebuild_sales_rollups`` command, to count
+the orders placed before they existed. Orders changed on a day while it is
+being rebuilt may be missed or counted twice, so on a live site rebuild past
+days only.
+"""
+import time
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, IntegerField, Q, Sum, When
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import Category, DailyCategorySales, DailyProductSales, Order, OrderItem, Product
+
+EXCLUDED_STATUSES = ('cancelled',)
+DEFAULT_DAYS = 30
+MAX_LIMIT = 100
+CENT = Decimal('0.01')
+
+# Rollup model, its key columns besides the date, and the group of a
+# contribution it sums
+ROLLUPS = (
+    (DailyProductSales, ('product_id', 'category_id'), 'products'),
+    (DailyCategorySales, ('category_id',), 'categories'),
+)
+
+
+def counts(order_status):
+    """Whether orders in ``order_status`` count as sales"""
+    return order_status not in EXCLUDED_STATUSES
+
+
+def _contributions(orders):
+    """
+    Sales of ``orders``, ``{order_id: created_at}``, as ``{order_id:
+    {'date': ..., 'products': {'product_id:category_id': [units, revenue]},
+    'categories': {'category_id': [...]}}}`` in the JSON form stored in
+    ``Order.recorded_sales``
+    """
+    rows = (
+        OrderItem.objects.filter(order_id__in=list(orders))
+        .order_by()
+        .values('order_id', 'product', category=F('product__category'))
+        .annotate(units=Sum('quantity'), revenue=Sum('total'))
+    )
+    contributions = {}
+    for row in rows:
+        order_id = row['order_id']
+        contribution = contributions.setdefault(order_id, {
+            'date': timezone.localdate(orders[order_id]).isoformat(), 'products': {}, 'categories': {},
+        })
+        keys = (('products', f"{row['product']}:{row['category']}"), ('categories', str(row['category'])))
+        for group, key in keys:
+            units, revenue = contribution[group].get(key, (0, '0'))
+            revenue = (Decimal(revenue) + row['revenue']).quantize(CENT)
+            contribution[group][key] = [units + row['units'], str(revenue)]
+    return contributions
+
+
+def _totals(contributions, group):
+    """Sum contributions into ``{(date, *ids): [orders, units, revenue]}`` rollup rows"""
+    totals = defaultdict(lambda: [0, 0, Decimal('0.00')])
+    for contribution in contributions:
+        day = parse_date(contribution['date'])
+        for key, (units, revenue) in contribution[group].items():
+            row = totals[(day, *map(int, key.split(':')))]
+            row[0] += 1
+            row[1] += units
+            row[2] += Decimal(revenue)
+    return totals
+
+
+def _add(model, key_fields, totals, sign):
+    """Add ``sign`` times ``totals`` to the rollup rows, creating missing rows when adding"""
+    if not totals:
+        return
+    if sign > 0:
+        model.objects.bulk_create(
+            [model(date=day, **dict(zip(key_fields, ids))) for day, *ids in totals],
+            ignore_conflicts=True,
+        )
+    condition = Q()
+    for day, *ids in totals:
+        condition |= Q(date=day, **dict(zip(key_fields, ids)))
+
+    def delta(column, index, output_field):
+        return Case(
+            *[When(Q(date=day, **dict(zip(key_fields, ids))), then=F(column) + sign * values[index])
+              for (day, *ids), values in totals.items()],
+            default=F(column),
+            output_field=output_field,
+        )
+
+    model.objects.filter(condition).update(
+        orders_count=delta('orders_count', 0, IntegerField()),
+        units_sold=delta('units_sold', 1, IntegerField()),
+        revenue=delta('revenue', 2, DecimalField(max_digits=14, decimal_places=2)),
+    )
+    if sign < 0:
+        # Leave no empty rows behind, as rebuild() would not create them
+        model.objects.filter(condition, orders_count=0).delete()
+
+
+def _apply(contribution, sign):
+    if contribution:
+        for model, key_fields, group in ROLLUPS:
+            _add(model, key_fields, _totals([contribution], group), sign)
+
+
+def refresh_order(order_id):
+    """Replace the sales an order last added to the rollups with its current sales"""
+    with transaction.atomic():
+        order = (
+            Order.objects.select_for_update().filter(pk=order_id)
+            .values('order_status', 'created_at', 'recorded_sales').first()
+        )
+        if order is None:
+            return
+        current = None
+        if counts(order['order_status']):
+            current = _contributions({order_id: order['created_at']}).get(order_id)
+        recorded = order['recorded_sales']
+        if current == recorded:
+            return
+        _apply(recorded, -1)
+        _apply(current, 1)
+        Order.objects.filter(pk=order_id).update(recorded_sales=current)
+
+
+def forget_order(recorded_sales):
+    """Take the recorded sales of a deleted order out of the rollups"""
+    with transaction.atomic():
+        _apply(recorded_sales, -1)
+
+
+def refresh_on_commit(order_id):
+    """Refresh an order's sales once the current transaction commits; failures are logged, not raised"""
+    transaction.on_commit(lambda: refresh_order(order_id), robust=True)
+
+
+def rebuild(since=None, until=None, chunk_size=1000, pause=0):
+    """
+    Recompute the rollups for the days from ``since`` to ``until``
+    (inclusive; all history when None), reading ``chunk_size`` orders at a
+    time, and reset the recorded sales of their orders. Returns the number
+    of orders counted.
+    """
+    orders = Order.objects.all()
+    if since is not None:
+        orders = orders.filter(created_at__date__gte=since)
+    if until is not None:
+        orders = orders.filter(created_at__date__lte=until)
+    orders.filter(order_status__in=EXCLUDED_STATUSES).filter(recorded_sales__isnull=False).update(recorded_sales=None)
+    orders = orders.exclude(order_status__in=EXCLUDED_STATUSES).order_by('created_at', 'id')
+
+    pending = {model: defaultdict(lambda: [0, 0, Decimal('0.00')]) for model, _, _ in ROLLUPS}
+    flushed_until = since
+    counted = 0
+    last = None
+    while True:
+        chunk = orders
+        if last is not None:
+            chunk = chunk.filter(Q(created_at__gt=last[0]) | Q(created_at=last[0], id__gt=last[1]))
+        chunk = list(chunk.values_list('created_at', 'id')[:chunk_size])
+        if not chunk:
+            break
+        contributions = _contributions({order_id: created_at for created_at, order_id in chunk})
+        for model, _, group in ROLLUPS:
+            for key, values in _totals(contributions.values(), group).items():
+                totals = pending[model][key]
+                for index, value in enumerate(values):
+                    totals[index] += value
+        Order.objects.bulk_update(
+            [Order(id=order_id, recorded_sales=contributions.get(order_id)) for _, order_id in chunk],
+            ['recorded_sales'],
+        )
+        counted += len(chunk)
+        last = chunk[-1]
+
+        # Every order dated before the day of the last one read has been read
+        complete_before = timezone.localdate(last[0])
+        _flush(pending, flushed_until, complete_before - timedelta(days=1))
+        flushed_until = complete_before
+        if len(chunk) < chunk_size:
+            break
+        if pause:
+            time.sleep(pause)
+
+    _flush(pending, flushed_until, until, final=True)
+    return counted
+
+
+def _flush(pending, since, until, final=False):
+    """Replace the rollup rows of the days from ``since`` to ``until`` with the pending totals"""
+    if until is not None and since is not None and until < since:
+        return
+    with transaction.atomic():
+        for model, key_fields, _ in ROLLUPS:
+            days = model.objects.all()
+            if since is not None:
+                days = days.filter(date__gte=since)
+            if until is not None:
+                days = days.filter(date__lte=until)
+            days.delete()
+
+            totals = pending[model]
+            keys = [key for key in totals if final or key[0] <= until]
+            model.objects.bulk_create([
+                model(date=day, orders_count=orders, units_sold=units, revenue=revenue, **dict(zip(key_fields, ids)))
+                for (day, *ids), (orders, units, revenue) in ((key, totals.pop(key)) for key in keys)
+            ], batch_size=1000)
+
+
+# Reads
+def _money(rows):
+    """Render the summed revenue of ``rows`` as a string with two decimals, like serialized amounts"""
+    for row in rows:
+        row['revenue'] = str(Decimal(row['revenue'] or 0).quantize(Decimal('0.01')))
+    return rows
+
+
+def parse_range(start, end):
+    """
+    Parse ``start`` / ``end`` (YYYY-MM-DD, inclusive) into dates, defaulting
+    to the last DEFAULT_DAYS days. Raises ValueError when invalid.
+    """
+    end_date = parse_date(end) if end else timezone.localdate()
+    if end_date is None:
+        raise ValueError('Dates must be in YYYY-MM-DD format')
+    start_date = parse_date(start) if start else end_date - timedelta(days=DEFAULT_DAYS - 1)
+    if start_date is None:
+        raise ValueError('Dates must be in YYYY-MM-DD format')
+    if start_date > end_date:
+        raise ValueError('start must not be after end')
+    return start_date, end_date
+
+
+def daily_sales(start, end, category_id=None):
+    """Units and revenue per day, from the category rollup"""
+    rows = DailyCategorySales.objects.filter(date__range=(start, end))
+    if category_id is not None:
+        rows = rows.filter(category_id=category_id)
+    return _money(list(
+        rows.order_by('date').values('date').annotate(units_sold=Sum('units_sold'), revenue=Sum('revenue'))
+    ))
+
+
+def top_products(start, end, limit=10, order_by='revenue', category_id=None):
+    """
+    The best-selling products between ``start`` and ``end``, by revenue or
+    units, counting only sales made in ``category_id`` when given
+    """
+    rows = DailyProductSales.objects.filter(date__range=(start, end))
+    if category_id is not None:
+        rows = rows.filter(category_id=category_id)
+    rows = (
+        rows.order_by().values('product')
+        .annotate(orders_count=Sum('orders_count'), units_sold=Sum('units_sold'), revenue=Sum('revenue'))
+        .order_by(f'-{order_by}', 'product')[:limit]
+    )
+    rows = _money(list(rows))
+    names = dict(Product.objects.filter(id__in=[row['product'] for row in rows]).values_list('id', 'name'))
+    return [{**row, 'product_name': names.get(row['product'])} for row in rows]
+
+
+def category_sales(start, end, order_by='revenue'):
+    """Sales per category between ``start`` and ``end``, by revenue or units"""
+    rows = _money(list(
+        DailyCategorySales.objects.filter(date__range=(start, end))
+        .order_by().values('category')
+        .annotate(orders_count=Sum('orders_count'), units_sold=Sum('units_sold'), revenue=Sum('revenue'))
+        .order_by(f'-{order_by}', 'category')
+    ))
+    names = dict(Category.objects.filter(id__in=[row['category'] for row in rows]).values_list('id', 'name'))
+    return [{**row, 'category_name': names.get(row['category'])} for row in rows]
@@ -0,0 +1,207 @@
+"""
+Time-limited stock reservations for carts.
+
+Adding a line to a cart, or changing its quantity, holds that quantity of
+stock for the user for ``STOCK_RESERVATION_TTL`` seconds. The stock a user
+can reserve is the stock on hand minus what other users hold, read while the
+product or variant rows are locked, so two carts can never hold the same
+units. Checkout converts the user's holds into sales, topping up any hold
+that has expired, instead of validating every line again.
+
+Sales take stock off with conditional UPDATEs (``stock_quantity >= quantity``)
+batched into one statement per table, so concurrent checkouts can never drive
+stock below zero, even for lines bought without a hold. A sale only bumps the
+catalog version, flushing the cached catalog pages and carts, when it sells a
+product or variant out: in between, cached pages may show a stock count up to
+``CATALOG_CACHE_TIMEOUT`` seconds old, but never a sold out item as in stock.
+
+Expired holds are ignored everywhere, so releasing them is only cleanup:
+``release_expired`` deletes them in bulk, in ``expires_at`` order.
+
+A cart line is identified by ``(product_id, variant_id)``; ``variant_id`` is
+None for lines without a variant, whose stock is the product's.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Sum, When
+from django.db.models.functions import Now
+from django.utils import timezone
+
+from .caching import bump_catalog_version
+from .models import Product, ProductVariant, StockReservation
+
+
+class InsufficientStock(Exception):
+    """Some lines could not be held; ``available`` maps their keys to the quantity that could"""
+
+    def __init__(self, available):
+        super().__init__('Insufficient stock')
+        self.available = available
+
+
+def _expires_at():
+    return timezone.now() + timedelta(seconds=getattr(settings, 'STOCK_RESERVATION_TTL', 15 * 60))
+
+
+def available_stock(user_id, keys, lock=False):
+    """
+    Stock the user can hold for each ``(product_id, variant_id)`` key: stock
+    on hand less the unexpired holds of other users. With ``lock``, the
+    product and variant rows stay locked until the transaction ends.
+    """
+    product_ids = sorted({product_id for product_id, variant_id in keys if not variant_id})
+    variant_ids = sorted({variant_id for _, variant_id in keys if variant_id})
+
+    products = Product.objects.filter(id__in=product_ids).order_by('id')
+    variants = ProductVariant.objects.filter(id__in=variant_ids).order_by('id')
+    if lock:
+        products = products.select_for_update()
+        variants = variants.select_for_update()
+    stock = {}
+    if product_ids:
+        stock.update(((product_id, None), quantity) for product_id, quantity
+                     in products.values_list('id', 'stock_quantity'))
+    if variant_ids:
+        stock.update(((product_id, variant_id), quantity) for variant_id, product_id, quantity
+                     in variants.values_list('id', 'product_id', 'stock_quantity'))
+
+    held = (
+        StockReservation.objects
+        .filter(Q(product_id__in=product_ids, variant__isnull=True) | Q(variant_id__in=variant_ids))
+        .filter(expires_at__gt=timezone.now())
+        .exclude(user_id=user_id)
+        .order_by()
+        .values_list('product_id', 'variant_id')
+        .annotate(held=Sum('quantity'))
+    )
+    for product_id, variant_id, quantity in held:
+        key = (product_id, variant_id)
+        if key in stock:
+            stock[key] -= quantity
+    return {key: max(stock.get(key, 0), 0) for key in keys}
+
+
+def reserve(user_id, lines):
+    """
+    Hold stock for the user's cart lines, ``[(product_id, variant_id,
+    quantity)]``, replacing their current holds and restarting the TTL.
+    Raises InsufficientStock, holding nothing, when a line cannot be held.
+    """
+    lines = [(product_id, variant_id or None, quantity) for product_id, variant_id, quantity in lines]
+    if not lines:
+        return
+    with transaction.atomic():
+        available = available_stock(user_id, [line[:2] for line in lines], lock=True)
+        shortages = {
+            (product_id, variant_id): available[product_id, variant_id]
+            for product_id, variant_id, quantity in lines
+            if quantity > available[product_id, variant_id]
+        }
+        if shortages:
+            raise InsufficientStock(shortages)
+
+        release(user_id, [line[:2] for line in lines])
+        expires_at = _expires_at()
+        StockReservation.objects.bulk_create([
+            StockReservation(user_id=user_id, product_id=product_id, variant_id=variant_id,
+                             quantity=quantity, expires_at=expires_at)
+            for product_id, variant_id, quantity in lines
+        ])
+
+
+def release(user_id, keys=None):
+    """Drop the user's holds for ``keys`` (every hold when None)"""
+    holds = StockReservation.objects.filter(user_id=user_id)
+    if keys is not None:
+        keys = list(keys)
+        if not keys:
+            return
+        condition = Q()
+        for product_id, variant_id in keys:
+            condition |= Q(product_id=product_id, variant_id=variant_id or None)
+        holds = holds.filter(condition)
+    holds.delete()
+
+
+def convert(user_id, lines):
+    """
+    Turn the user's holds for ``lines`` into sales at checkout: release the
+    holds and take the quantities off the stock. Lines whose hold expired or
+    is short are held again first. Raises InsufficientStock, changing
+    nothing, if the stock is gone.
+    """
+    lines = [(product_id, variant_id or None, quantity) for product_id, variant_id, quantity in lines]
+    now = timezone.now()
+    holds = {
+        (product_id, variant_id): quantity
+        for product_id, variant_id, quantity in StockReservation.objects.filter(
+            user_id=user_id, expires_at__gt=now
+        ).values_list('product_id', 'variant_id', 'quantity')
+    }
+    with transaction.atomic():
+        reserve(user_id, [line for line in lines if holds.get(line[:2], 0) < line[2]])
+        release(user_id)
+        decrement_stock(lines)
+
+
+def decrement_stock(lines):
+    """
+    Take ``[(product_id, variant_id, quantity)]`` off the stock with one
+    conditional UPDATE per table, which only changes rows that still have
+    enough stock. Raises InsufficientStock, changing nothing, if any row has
+    too little.
+    """
+    quantities = {Product: defaultdict(int), ProductVariant: defaultdict(int)}
+    keys = {Product: {}, ProductVariant: {}}
+    for product_id, variant_id, quantity in lines:
+        model, pk = (ProductVariant, variant_id) if variant_id else (Product, product_id)
+        quantities[model][pk] += quantity
+        keys[model][pk] = (product_id, variant_id or None)
+
+    with transaction.atomic():
+        for model, wanted in quantities.items():
+            if not wanted:
+                continue
+            condition = Q()
+            for pk, quantity in wanted.items():
+                condition |= Q(pk=pk, stock_quantity__gte=quantity)
+            updated = model.objects.filter(condition).update(
+                stock_quantity=Case(
+                    *[When(pk=pk, then=F('stock_quantity') - quantity) for pk, quantity in wanted.items()],
+                    default=F('stock_quantity'),
+                    output_field=IntegerField(),
+                ),
+                updated_at=Now(),
+            )
+            if updated != len(wanted):
+                stock = dict(model.objects.filter(pk__in=wanted).values_list('pk', 'stock_quantity'))
+                raise InsufficientStock({
+                    keys[model][pk]: max(stock.get(pk, 0), 0)
+                    for pk, quantity in wanted.items() if stock.get(pk, 0) < quantity
+                })
+
+        # update() sends no signals
+        if quantities[ProductVariant]:
+            Product.refresh_variants_stock({key[0] for key in keys[ProductVariant].values()})
+        if any(
+            model.objects.filter(pk__in=wanted, stock_quantity__lte=0).exists()
+            for model, wanted in quantities.items() if wanted
+        ):
+            bump_catalog_version()
+
+
+def release_expired(chunk_size=1000):
+    """Delete expired holds, ``chunk_size`` at a time. Returns the number deleted."""
+    expired = StockReservation.objects.filter(expires_at__lte=timezone.now()).order_by('expires_at')
+    deleted = 0
+    while True:
+        ids = list(expired.values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            return deleted
+        count, _ = StockReservation.objects.filter(id__in=ids).delete()
+        deleted += count
+        if len(ids) < chunk_size:
+            return deleted
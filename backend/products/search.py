@@ -0,0 +1,199 @@
+"""
+Full-text product search backed by an SQLite FTS5 index.
+
+The index lives in a virtual table whose rowid is the product id. Each row
+holds the searchable text of one active product: its name, description,
+category name and the attributes of its active variants. Rows are kept in
+sync by the signal handlers in ``products.signals`` and can be rebuilt from
+scratch with the ``rebuild_search_index`` management command.
+
+On databases without FTS5 the search falls back to ``icontains`` lookups.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Prefetch, Q
+from django.db.models.expressions import RawSQL
+
+from .models import Product, ProductVariant
+
+SEARCH_TABLE = 'products_productsearch'
+
+# Column weights for bm25(), in column order: name, description, category, attributes
+BM25_WEIGHTS = (10.0, 1.0, 4.0, 2.0)
+
+CREATE_TABLE_SQL = (
+    f'CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5('
+    "name, description, category, attributes, tokenize = 'unicode61 remove_diacritics 2')"
+)
+DROP_TABLE_SQL = f'DROP TABLE IF EXISTS {SEARCH_TABLE}'
+RANK_SQL = f'bm25({SEARCH_TABLE}, {", ".join(str(w) for w in BM25_WEIGHTS)})'
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def is_supported():
+    return connection.vendor == 'sqlite'
+
+
+def build_match_query(text):
+    """
+    Turn free text into an FTS5 MATCH expression.
+
+    Every token is quoted so user input can never be parsed as FTS syntax, and
+    the last token is a prefix match so results update while the user types.
+    Returns None when the text has no searchable tokens.
+    """
+    tokens = TOKEN_RE.findall(text.lower())
+    if not tokens:
+        return None
+    terms = [f'"{token}"' for token in tokens]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def search_queryset(queryset, text):
+    """Filter a Product queryset by ``text`` and order it by BM25 relevance"""
+    if not is_supported():
+        return _fallback_search(queryset, text)
+
+    match = build_match_query(text)
+    if match is None:
+        return queryset.none()
+
+    product_table = Product._meta.db_table
+    return queryset.extra(
+        tables=[SEARCH_TABLE],
+        where=[
+            f'{SEARCH_TABLE}.rowid = {product_table}.id',
+            f'{SEARCH_TABLE} MATCH %s',
+        ],
+        params=[match],
+        select={'search_rank': RANK_SQL},
+    ).order_by('search_rank', 'id')
+
+
+def filter_queryset(queryset, text):
+    """
+    Filter a Product queryset by ``text`` without ranking it.
+
+    Unlike ``search_queryset`` the result can be nested as a subquery, e.g.
+    for facet counts.
+    """
+    if not is_supported():
+        return _fallback_search(queryset, text)
+
+    match = build_match_query(text)
+    if match is None:
+        return queryset.none()
+    return queryset.filter(
+        id__in=RawSQL(f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s', [match])
+    )
+
+
+def _fallback_search(queryset, text):
+    query = Q()
+    for token in TOKEN_RE.findall(text):
+        query &= (
+            Q(name__icontains=token) |
+            Q(description__icontains=token) |
+            Q(category__name__icontains=token)
+        )
+    return queryset.filter(query)
+
+
+def _active_variants_prefetch():
+    return Prefetch(
+        'variants',
+        queryset=ProductVariant.objects.filter(is_active=True).only('product_id', 'sku', 'size', 'color', 'material'),
+        to_attr='active_variants',
+    )
+
+
+def _attributes_text(variants):
+    values = []
+    for variant in variants:
+        values.extend(value for value in (variant.sku, variant.size, variant.color, variant.material) if value)
+    return ' '.join(values)
+
+
+def _document(product, variants):
+    return (
+        product.pk,
+        product.name,
+        product.description,
+        product.category.name,
+        _attributes_text(variants),
+    )
+
+
+def _write_documents(cursor, documents):
+    cursor.executemany(
+        f'INSERT INTO {SEARCH_TABLE} (rowid, name, description, category, attributes) '
+        'VALUES (%s, %s, %s, %s, %s)',
+        documents,
+    )
+
+
+def index_products(product_ids):
+    """Refresh the index rows of the given products"""
+    if not is_supported():
+        return
+    product_ids = list(product_ids)
+    if not product_ids:
+        return
+
+    products = (
+        Product.objects.filter(id__in=product_ids, is_active=True)
+        .select_related('category')
+        .prefetch_related(_active_variants_prefetch())
+    )
+    documents = [_document(product, product.active_variants) for product in products]
+
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s',
+            [(product_id,) for product_id in product_ids],
+        )
+        _write_documents(cursor, documents)
+
+
+def unindex_products(product_ids):
+    if not is_supported():
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s',
+            [(product_id,) for product_id in product_ids],
+        )
+
+
+def rebuild_index(chunk_size=2000):
+    """Rebuild the whole index, streaming active products in chunks. Returns the row count."""
+    if not is_supported():
+        return 0
+
+    with connection.cursor() as cursor:
+        cursor.execute(DROP_TABLE_SQL)
+        cursor.execute(CREATE_TABLE_SQL)
+
+    indexed = 0
+    last_id = 0
+    while True:
+        products = list(
+            Product.objects.filter(is_active=True, id__gt=last_id)
+            .select_related('category')
+            .prefetch_related(_active_variants_prefetch())
+            .order_by('id')[:chunk_size]
+        )
+        if not products:
+            break
+        with connection.cursor() as cursor:
+            _write_documents(cursor, [_document(product, product.active_variants) for product in products])
+        indexed += len(products)
+        last_id = products[-1].id
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')")
+    return indexed
+
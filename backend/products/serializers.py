@@ -1,22 +1,104 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from django.core.exceptions import FieldDoesNotExist
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
 from django.utils import timezone
 from .models import (
     Category, Product, ProductVariant, CartItem, Order, OrderItem, 
     Payment, Wishlist, Coupon, CouponUsage
 )
+from . import reservations
+from .cart import cart_snapshot, line_stock
+from .cart_store import get_cart_store
 
-class CategorySerializer(serializers.ModelSerializer):
-    products_count = serializers.SerializerMethodField()
+class SparseFieldsetMixin:
+    """
+    Narrow a serializer to the ``fields`` / ``exclude`` keyword arguments,
+    usually taken from the ``?fields=`` / ``?exclude=`` query parameters.
+
+    ``get_projection`` maps the selected fields back to the model columns they
+    read so views can narrow their queryset with ``.only()`` as well.
+    """
+    # Model fields read by computed (property) fields
+    field_dependencies = {}
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        exclude = kwargs.pop('exclude', None)
+        super().__init__(*args, **kwargs)
+        for name in self.excluded_field_names(fields, exclude):
+            self.fields.pop(name, None)
+
+    @classmethod
+    def excluded_field_names(cls, fields=None, exclude=None):
+        excluded = set(exclude or [])
+        if fields:
+            excluded.update(name for name in cls.Meta.fields if name not in fields)
+        return excluded
+
+    @classmethod
+    def selects(cls, name, fields=None, exclude=None):
+        return name in cls.Meta.fields and name not in cls.excluded_field_names(fields, exclude)
+
+    @classmethod
+    def get_projection(cls, fields=None, exclude=None):
+        """
+        Return ``(only, related)``: the model field paths to pass to
+        ``QuerySet.only()`` and the relations to ``select_related()`` for the
+        selected fields. Returns None when nothing is narrowed or a selected
+        field cannot be mapped to columns.
+        """
+        excluded = cls.excluded_field_names(fields, exclude)
+        if not excluded:
+            return None
+
+        opts = cls.Meta.model._meta
+        only = {opts.pk.name}
+        related = set()
+        for name in cls.Meta.fields:
+            if name in excluded:
+                continue
+            if name in cls.field_dependencies:
+                only.update(cls.field_dependencies[name])
+                continue
+
+            field = cls._declared_fields.get(name)
+            if field is not None and field.write_only:
+                continue
+            if isinstance(field, serializers.BaseSerializer):
+                # Nested serializers load their own rows
+                if any(f.name == name and f.many_to_one for f in opts.get_fields()):
+                    only.add(name)
+                    related.add(name)
+                continue
+
+            source = (field.source if field is not None and field.source else name).split('.')
+            try:
+                model_field = opts.get_field(source[0])
+            except FieldDoesNotExist:
+                return None
+            if len(source) > 1:
+                if not model_field.many_to_one:
+                    return None
+                related.add(source[0])
+                only.add(source[0])
+            only.add('__'.join(source))
+        return only, related
+
+class CategorySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Category
         fields = ['id', 'name', 'description', 'image', 'is_active', 'products_count']
-
-    def get_products_count(self, obj):
-        return obj.products.filter(is_active=True).count()
+        read_only_fields = ['products_count']
 
 class ProductVariantSerializer(serializers.ModelSerializer):
+    # Model fields read by computed (property) fields
+    field_dependencies = {
+        'final_price': ['price_adjustment', 'product__price'],
+        'is_in_stock': ['stock_quantity'],
+    }
     final_price = serializers.ReadOnlyField()
     is_in_stock = serializers.ReadOnlyField()
 
@@ -28,7 +110,12 @@ class ProductVariantSerializer(serializers.ModelSerializer):
             'image', 'is_active', 'is_in_stock'
         ]
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    field_dependencies = {
+        'is_on_sale': ['price', 'old_price'],
+        'discount_percentage': ['price', 'old_price'],
+        'is_in_stock': ['has_variants', 'stock_quantity', 'variants_stock_quantity'],
+    }
     category_name = serializers.CharField(source='category.name', read_only=True)
     is_on_sale = serializers.ReadOnlyField()
     discount_percentage = serializers.ReadOnlyField()
@@ -45,7 +132,22 @@ class ProductSerializer(serializers.ModelSerializer):
             'has_variants', 'variants', 'created_at', 'updated_at'
         ]
 
+class ProductListSerializer(ProductSerializer):
+    """Compact product representation for list pages, without nested variants"""
+
+    class Meta(ProductSerializer.Meta):
+        fields = [
+            field for field in ProductSerializer.Meta.fields if field != 'variants'
+        ]
+
 class CartItemSerializer(serializers.ModelSerializer):
+    # Model fields read by computed (property) fields
+    field_dependencies = {
+        'unit_price': ['variant__price_adjustment', 'variant__product__price', 'product__price'],
+        'total_price': ['quantity', 'variant__price_adjustment', 'variant__product__price', 'product__price'],
+        'available_stock': ['variant__stock_quantity', 'product__stock_quantity'],
+        'is_out_of_stock': ['variant__stock_quantity', 'product__stock_quantity'],
+    }
     product = ProductSerializer(read_only=True)
     variant = ProductVariantSerializer(read_only=True)
     product_id = serializers.IntegerField(write_only=True)
@@ -66,70 +168,105 @@ class CartItemSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         user = self.context['request'].user
         product_id = validated_data.pop('product_id')
-        variant_id = validated_data.pop('variant_id', None)
+        variant_id = validated_data.pop('variant_id', None) or None
         
+        # Check the product, variant and stock availability in one query
         try:
-            product = Product.objects.get(id=product_id, is_active=True)
+            available_stock = line_stock(product_id, variant_id)
         except Product.DoesNotExist:
             raise serializers.ValidationError({'product_id': 'Product not found or inactive.'})
+        except ProductVariant.DoesNotExist:
+            raise serializers.ValidationError({'variant_id': 'Product variant not found or inactive.'})
         
-        variant = None
-        if variant_id:
-            try:
-                variant = ProductVariant.objects.get(id=variant_id, product=product, is_active=True)
-            except ProductVariant.DoesNotExist:
-                raise serializers.ValidationError({'variant_id': 'Product variant not found or inactive.'})
-        
-        # Check stock availability
-        available_stock = variant.stock_quantity if variant else product.stock_quantity
         if validated_data['quantity'] > available_stock:
             raise serializers.ValidationError({
                 'quantity': f'Only {available_stock} items available in stock.'
             })
         
-        # Check if item already in cart
-        cart_item, created = CartItem.objects.get_or_create(
-            user=user,
-            product=product,
-            variant=variant,
-            defaults={'quantity': validated_data['quantity']}
-        )
-        
-        if not created:
+        # Check if item already in cart. The stored lines are only a hint:
+        # add() falls back to the existing row when they missed it, and a
+        # rejected update then rolls back the hold taken for the new line.
+        cart_store = get_cart_store()
+        with transaction.atomic():
+            line = cart_store.find_line(user.id, product_id, variant_id)
+            if line is None:
+                self.reserve(user.id, product_id, variant_id, validated_data['quantity'])
+                line, created = cart_store.add(user.id, product_id, variant_id, validated_data['quantity'])
+                if created:
+                    return CartItem(user=user, **line)
+
             # Update quantity if item already exists
-            new_quantity = cart_item.quantity + validated_data['quantity']
+            new_quantity = line['quantity'] + validated_data['quantity']
             if new_quantity > available_stock:
                 raise serializers.ValidationError({
-                    'quantity': f'Only {available_stock} items available in stock. You already have {cart_item.quantity} in cart.'
+                    'quantity': f'Only {available_stock} items available in stock. You already have {line["quantity"]} in cart.'
                 })
-            cart_item.quantity = new_quantity
-            cart_item.save()
-        
-        return cart_item
+            self.reserve(user.id, product_id, variant_id, new_quantity)
+            if not cart_store.set_quantity(user.id, line['id'], new_quantity):
+                raise serializers.ValidationError('Cart item not found.')
+            line['quantity'] = new_quantity
+            return CartItem(user=user, **line)
 
     def update(self, instance, validated_data):
         quantity = validated_data.get('quantity', instance.quantity)
         
         # Validate stock
-        available_stock = instance.available_stock
+        available_stock = line_stock(instance.product_id, instance.variant_id, active_only=False)
         if quantity > available_stock:
             raise serializers.ValidationError({
                 'quantity': f'Only {available_stock} items available in stock.'
             })
         
+        self.reserve(instance.user_id, instance.product_id, instance.variant_id, quantity)
+        if not get_cart_store().set_quantity(instance.user_id, instance.id, quantity):
+            raise serializers.ValidationError('Cart item not found.')
         instance.quantity = quantity
-        instance.save()
         return instance
 
+    def reserve(self, user_id, product_id, variant_id, quantity):
+        """Hold stock for the line, net of what other carts hold"""
+        try:
+            reservations.reserve(user_id, [(product_id, variant_id, quantity)])
+        except reservations.InsufficientStock as error:
+            available_stock = error.available[product_id, variant_id or None]
+            raise serializers.ValidationError({
+                'quantity': f'Only {available_stock} items available in stock.'
+            })
+
+class CartOperationSerializer(serializers.Serializer):
+    REQUIRED_FIELDS = {
+        'add': ['product_id', 'quantity'],
+        'update': ['item_id', 'quantity'],
+        'remove': ['item_id'],
+        'clear': [],
+    }
+    op = serializers.ChoiceField(choices=list(REQUIRED_FIELDS))
+    product_id = serializers.IntegerField(required=False)
+    variant_id = serializers.IntegerField(required=False, allow_null=True)
+    item_id = serializers.IntegerField(required=False)
+    quantity = serializers.IntegerField(required=False, min_value=1)
+
+    def validate(self, data):
+        missing = [field for field in self.REQUIRED_FIELDS[data['op']] if field not in data]
+        if missing:
+            raise serializers.ValidationError({field: 'This field is required.' for field in missing})
+        return data
+
+class CartBatchSerializer(serializers.Serializer):
+    operations = CartOperationSerializer(many=True, allow_empty=False, max_length=100)
+
 class OrderItemSerializer(serializers.ModelSerializer):
-    product_name = serializers.CharField(source='product.name', read_only=True)
-    product_image = serializers.ImageField(source='product.image', read_only=True)
+    """Reads the product details snapshotted at checkout, never the catalog"""
 
     class Meta:
         model = OrderItem
-        fields = ['id', 'product', 'product_name', 'product_image', 'quantity', 'price', 'total']
+        fields = [
+            'id', 'product', 'variant', 'product_name', 'product_image', 'sku', 'variant_attributes',
+            'quantity', 'price', 'total'
+        ]
+        read_only_fields = fields
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
     user_email = serializers.CharField(source='user.email', read_only=True)
     coupon_code = serializers.CharField(source='coupon.code', read_only=True)
@@ -147,6 +284,46 @@ class OrderSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['order_number', 'user']
 
+class OrderSummarySerializer(serializers.ModelSerializer):
+    """
+    Order header for order history lists: the item count and the first
+    item's name and thumbnail instead of the items. Expects the annotations
+    added by ``annotate_queryset``.
+    """
+    items_count = serializers.IntegerField(read_only=True)
+    first_item_name = serializers.CharField(read_only=True, allow_null=True)
+    first_item_image = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Order
+        fields = [
+            'id', 'order_number', 'subtotal', 'discount_amount', 'tax_amount',
+            'shipping_cost', 'total_amount', 'order_status', 'payment_status',
+            'items_count', 'first_item_name', 'first_item_image',
+            'created_at', 'updated_at'
+        ]
+
+    @classmethod
+    def annotate_queryset(cls, queryset):
+        """Add the item count and first item columns, all read by one query"""
+        first_item = OrderItem.objects.filter(order=OuterRef('pk')).order_by('id')
+        return queryset.only(*[
+            name for name in cls.Meta.fields if name not in cls._declared_fields
+        ]).annotate(
+            items_count=Count('items'),
+            first_item_name=Subquery(first_item.values('product_name')[:1]),
+            first_item_image=Subquery(first_item.values('product_image')[:1]),
+        )
+
+    def get_first_item_image(self, order):
+        if not order.first_item_image:
+            return None
+        url = OrderItem._meta.get_field('product_image').storage.url(order.first_item_image)
+        request = self.context.get('request')
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
+
 class CouponSerializer(serializers.ModelSerializer):
     is_valid = serializers.SerializerMethodField()
 
@@ -206,29 +383,17 @@ class CheckoutSerializer(serializers.Serializer):
     coupon_code = serializers.CharField(max_length=50, required=False, allow_blank=True)
 
     def validate(self, data):
-        # Validate that user has items in cart
-        user = self.context['request'].user
-        cart_items = CartItem.objects.filter(user=user)
+        # Validate that user has items in cart, using the cart snapshot the
+        # view passes in the context when it has one
+        cart_items = self.context.get('cart_items')
+        if cart_items is None:
+            cart_items = cart_snapshot(self.context['request'].user)
         
-        if not cart_items.exists():
+        if not cart_items:
             raise serializers.ValidationError('Cart is empty. Add items to cart before checkout.')
         
-        # Validate stock availability and check for out of stock items
-        out_of_stock_items = []
-        for item in cart_items:
-            if item.is_out_of_stock:
-                out_of_stock_items.append(item.product.name)
-            elif item.quantity > item.available_stock:
-                raise serializers.ValidationError(
-                    f'Insufficient stock for {item.product.name}. '
-                    f'Available: {item.available_stock}, Requested: {item.quantity}'
-                )
-        
-        if out_of_stock_items:
-            raise serializers.ValidationError(
-                f'The following items are out of stock: {", ".join(out_of_stock_items)}. '
-                f'Please remove them from your cart to proceed.'
-            )
+        # Stock is checked by checkout itself, when it converts the cart's
+        # stock reservations into sales
         
         # Validate coupon if provided
         coupon_code = data.get('coupon_code')
@@ -258,7 +423,7 @@ class PaymentSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['transaction_id', 'payment_intent_id']
 
-class WishlistSerializer(serializers.ModelSerializer):
+class WishlistSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
     product_id = serializers.IntegerField(write_only=True)
 
@@ -0,0 +1,179 @@
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import reporting, search
+from .cart import invalidate_cart
+from .cart_store import get_cart_store
+from .caching import bump_catalog_version, invalidate_order
+from .models import (
+    CartItem, CatalogTombstone, Category, Order, OrderItem, PricingRule, Product, ProductVariant,
+)
+from .pricing import clear_rules_cache
+
+
+# Search index maintenance
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    search.index_products([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    search.unindex_products([instance.pk])
+
+
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+def reindex_variant_product(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    search.index_products([instance.product_id])
+
+
+@receiver(post_save, sender=Category)
+def reindex_category_products(sender, instance, created=False, raw=False, **kwargs):
+    if raw or created:
+        return
+    search.index_products(instance.products.values_list('id', flat=True))
+
+
+# Catalog response cache invalidation
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_catalog_cache(sender, raw=False, **kwargs):
+    if raw:
+        return
+    bump_catalog_version()
+
+
+# Category product counts
+@receiver(pre_save, sender=Product)
+def remember_category_listing(sender, instance, raw=False, **kwargs):
+    instance._previous_listing = None
+    if raw or instance.pk is None:
+        return
+    instance._previous_listing = (
+        Product.objects.filter(pk=instance.pk).values_list('category_id', 'is_active').first()
+    )
+
+
+def _adjust_products_count(category_id, delta):
+    Category.objects.filter(pk=category_id).update(
+        products_count=F('products_count') + delta,
+        updated_at=timezone.now(),
+    )
+
+
+@receiver(post_save, sender=Product)
+def update_category_counts(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_listing', None)
+    current = (instance.category_id, instance.is_active)
+    if previous == current:
+        return
+    if previous is not None and previous[1]:
+        _adjust_products_count(previous[0], -1)
+    if instance.is_active:
+        _adjust_products_count(instance.category_id, 1)
+
+
+@receiver(post_delete, sender=Product)
+def decrement_category_count(sender, instance, **kwargs):
+    if instance.is_active:
+        _adjust_products_count(instance.category_id, -1)
+
+
+# Aggregate variant stock
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+def refresh_product_variants_stock(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    Product.refresh_variants_stock([instance.product_id])
+
+
+# Delta sync tombstones
+TOMBSTONE_MODEL_NAMES = {
+    Category: 'category',
+    Product: 'product',
+    ProductVariant: 'variant',
+}
+
+
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=ProductVariant)
+def record_tombstone(sender, instance, **kwargs):
+    CatalogTombstone.objects.create(model_name=TOMBSTONE_MODEL_NAMES[sender], object_id=instance.pk)
+
+
+# Cart cache invalidation
+@receiver(post_save, sender=CartItem)
+@receiver(post_delete, sender=CartItem)
+def invalidate_cached_cart(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    invalidate_cart(instance.user_id)
+    get_cart_store().discard(instance.user_id)
+
+
+# Order detail cache invalidation
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def invalidate_cached_order(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    invalidate_order(instance.pk)
+
+
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+def invalidate_cached_order_items(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    invalidate_order(instance.order_id)
+
+
+# Sales rollups
+@receiver(post_save, sender=Order)
+def refresh_order_sales(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    reporting.refresh_on_commit(instance.pk)
+
+
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+def refresh_order_item_sales(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    reporting.refresh_on_commit(instance.order_id)
+
+
+@receiver(pre_delete, sender=Order)
+def forget_order_sales(sender, instance, **kwargs):
+    # The row is gone by the time the order's items refresh it
+    recorded_sales = Order.objects.filter(pk=instance.pk).values_list('recorded_sales', flat=True).first()
+    if recorded_sales:
+        transaction.on_commit(lambda: reporting.forget_order(recorded_sales), robust=True)
+
+
+# Pricing rules cache
+@receiver(post_save, sender=PricingRule)
+@receiver(post_delete, sender=PricingRule)
+def invalidate_pricing_rules(sender, raw=False, **kwargs):
+    if raw:
+        return
+    transaction.on_commit(clear_rules_cache)
+    # Cached cart payloads are keyed by the catalog version and carry totals
+    bump_catalog_version()
@@ -0,0 +1,151 @@
+"""
+Delta sync of the catalog for offline-capable clients.
+
+A client sends back the opaque ``watermark`` token from its previous sync and
+receives the categories, products and variants changed since then, plus the
+ids of rows that were deactivated or deleted. Without a token it receives a
+full snapshot. Each stream is read with a keyset on ``(updated_at, id)``
+(``(deleted_at, id)`` for tombstones), so responses are bounded and can be
+paged with ``has_more``.
+
+Rows are only delivered once they are older than ``SETTLE_DELAY``. A row
+saved by a transaction that is still open when a sync runs would otherwise be
+skipped for good, since its ``updated_at`` is earlier than rows the client
+has already seen.
+"""
+import base64
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import CatalogTombstone, Category, Product, ProductVariant
+from .serializers import CategorySerializer, ProductListSerializer, ProductVariantSerializer
+
+SETTLE_DELAY = timedelta(seconds=2)
+DEFAULT_LIMIT = 500
+
+STREAMS = ['categories', 'products', 'variants']
+TOMBSTONE_STREAMS = {'category': 'categories', 'product': 'products', 'variant': 'variants'}
+
+
+class InvalidWatermark(ValueError):
+    pass
+
+
+class SyncVariantSerializer(ProductVariantSerializer):
+
+    class Meta(ProductVariantSerializer.Meta):
+        fields = ['product'] + ProductVariantSerializer.Meta.fields + ['updated_at']
+
+
+def encode_watermark(positions):
+    raw = json.dumps(positions, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_watermark(token):
+    if not token:
+        return {}
+    try:
+        positions = {
+            stream: (parse_datetime(position[0]), int(position[1]))
+            for stream, position in json.loads(base64.urlsafe_b64decode(token.encode())).items()
+            if stream in STREAMS + ['tombstones']
+        }
+    except (TypeError, ValueError, AttributeError, IndexError, KeyError):
+        raise InvalidWatermark('Invalid sync watermark')
+    if any(timestamp is None for timestamp, _ in positions.values()):
+        raise InvalidWatermark('Invalid sync watermark')
+    return positions
+
+
+def _after(queryset, timestamp_field, position):
+    if position is None:
+        return queryset
+    timestamp, pk = position
+    return queryset.filter(
+        Q(**{f'{timestamp_field}__gt': timestamp}) |
+        Q(**{timestamp_field: timestamp, 'id__gt': pk})
+    )
+
+
+def _read_stream(queryset, timestamp_field, position, horizon, limit):
+    rows = list(
+        _after(queryset, timestamp_field, position)
+        .filter(**{f'{timestamp_field}__lt': horizon})
+        .order_by(timestamp_field, 'id')[:limit + 1]
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if rows:
+        position = (getattr(rows[-1], timestamp_field), rows[-1].id)
+    return rows, position, has_more
+
+
+def catalog_changes(token=None, limit=DEFAULT_LIMIT):
+    """Return the sync payload for the given watermark token"""
+    positions = decode_watermark(token)
+    now = timezone.now()
+    horizon = now - SETTLE_DELAY
+
+    # Tombstones older than the retention window are pruned, so clients that
+    # were away longer than that have to start over from a full snapshot.
+    retention = timedelta(days=getattr(settings, 'CATALOG_TOMBSTONE_RETENTION_DAYS', 30))
+    reset = bool(positions) and (
+        'tombstones' not in positions or positions['tombstones'][0] < now - retention
+    )
+    if reset:
+        positions = {}
+
+    querysets = {
+        'categories': (Category.objects.all(), CategorySerializer),
+        'products': (Product.objects.select_related('category'), ProductListSerializer),
+        'variants': (ProductVariant.objects.all(), SyncVariantSerializer),
+    }
+
+    payload = {'reset': reset}
+    deleted = {stream: [] for stream in STREAMS}
+    has_more = False
+    new_positions = {}
+    for stream, (queryset, serializer_class) in querysets.items():
+        rows, position, more = _read_stream(queryset, 'updated_at', positions.get(stream), horizon, limit)
+        has_more = has_more or more
+        new_positions[stream] = position
+        payload[stream] = serializer_class([row for row in rows if row.is_active], many=True).data
+        deleted[stream].extend(row.id for row in rows if not row.is_active)
+
+    # A full snapshot has nothing to delete locally, so it only starts the
+    # tombstone stream at the horizon.
+    tombstone_position = (horizon, 0)
+    if positions:
+        tombstones, position, more = _read_stream(
+            CatalogTombstone.objects.all(), 'deleted_at', positions['tombstones'], horizon, limit
+        )
+        has_more = has_more or more
+        for tombstone in tombstones:
+            deleted[TOMBSTONE_STREAMS[tombstone.model_name]].append(tombstone.object_id)
+        # Keep the position fresh while no deletions happen so it never
+        # looks older than the retention window.
+        if more:
+            tombstone_position = position
+    new_positions['tombstones'] = tombstone_position
+
+    payload['deleted'] = deleted
+    payload['has_more'] = has_more
+    payload['watermark'] = encode_watermark({
+        stream: [position[0].isoformat(), position[1]]
+        for stream, position in new_positions.items()
+        if position is not None
+    })
+    return payload
+
+
+def prune_tombstones():
+    """Delete tombstones older than the retention window. Returns the number deleted."""
+    retention = timedelta(days=getattr(settings, 'CATALOG_TOMBSTONE_RETENTION_DAYS', 30))
+    deleted, _ = CatalogTombstone.objects.filter(deleted_at__lt=timezone.now() - retention).delete()
+    return deleted
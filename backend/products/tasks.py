@@ -0,0 +1,52 @@
+"""
+Background tasks run by the job queue (products/jobs.py) after an order.
+"""
+from django.conf import settings
+from django.core.mail import mail_admins, send_mail
+from django.db.models import Q
+
+from .jobs import task
+from .models import Order, Product
+
+
+@task('send_order_confirmation')
+def send_order_confirmation(order_id):
+    """Email the customer a summary of their order"""
+    order = Order.objects.filter(id=order_id).first()
+    if order is None:
+        return
+    # The items carry the product details from checkout; no catalog reads
+    lines = [
+        f'{item.quantity} x {item.product_name} - ₹{item.total}'
+        for item in order.items.all()
+    ]
+    send_mail(
+        subject=f'Order {order.order_number} confirmed',
+        message='\n'.join([
+            f'Hi {order.shipping_name},',
+            '',
+            f'Thank you for your order {order.order_number}.',
+            '',
+            *lines,
+            '',
+            f'Total: ₹{order.total_amount}',
+        ]),
+        from_email=None,
+        recipient_list=[order.shipping_email],
+    )
+
+
+@task('notify_low_stock')
+def notify_low_stock(product_ids):
+    """Tell the admins which of the products are running out of stock"""
+    threshold = getattr(settings, 'LOW_STOCK_THRESHOLD', 5)
+    products = Product.objects.filter(id__in=product_ids, is_active=True).filter(
+        Q(has_variants=False, stock_quantity__lte=threshold)
+        | Q(has_variants=True, variants_stock_quantity__lte=threshold)
+    ).order_by('name')
+    lines = [
+        f'{product.name}: {product.variants_stock_quantity if product.has_variants else product.stock_quantity} left'
+        for product in products
+    ]
+    if lines:
+        mail_admins(subject=f'{len(lines)} products are low on stock', message='\n'.join(lines))
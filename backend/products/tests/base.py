@@ -0,0 +1,49 @@
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from rest_framework.test import APIClient
+
+from ..models import Category, Order, Product
+
+CHECKOUT = {
+    'shipping_name': 'Buyer', 'shipping_email': 'buyer@example.com', 'shipping_phone': '9999999999',
+    'shipping_address_line1': '1 Main Road', 'shipping_city': 'Pune', 'shipping_state': 'MH',
+    'shipping_postal_code': '411001', 'payment_method': 'cash_on_delivery',
+}
+
+
+class ShopFixture:
+    """
+    A 'Shirts' category with one 'Shirt' product of ``stock`` units, and a
+    buyer with an authenticated API client. Mix in before TestCase or
+    TransactionTestCase.
+    """
+    stock = 10
+
+    def setUp(self):
+        super().setUp()
+        self.category = Category.objects.create(name='Shirts')
+        self.product = self.create_product('Shirt')
+        self.user = User.objects.create_user('buyer', 'buyer@example.com', 'password')
+        self.client = self.api_client(self.user)
+
+    def create_product(self, name, **fields):
+        fields = {'description': 'Cotton', 'category': self.category, 'price': Decimal('10.00'),
+                  'stock_quantity': self.stock, **fields}
+        return Product.objects.create(name=name, **fields)
+
+    def api_client(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def add_to_cart(self, quantity=1, client=None, **data):
+        client = client or self.client
+        return client.post('/api/cart/add/', {'product_id': self.product.id, 'quantity': quantity, **data},
+                           format='json')
+
+    def create_order(self, **fields):
+        """An order with no items, created outside checkout"""
+        fields = {'user': self.user, 'subtotal': Decimal('10.00'), 'total_amount': Decimal('10.00'),
+                  **{name: value for name, value in CHECKOUT.items() if name != 'payment_method'}, **fields}
+        return Order.objects.create(**fields)
@@ -0,0 +1,17 @@
+from django.core.cache import cache
+from django.test import TestCase
+
+from ..caching import bump_version, versioned_key
+
+
+class VersionedKeyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_bumping_a_namespace_changes_only_its_keys(self):
+        cart_key, order_key = versioned_key('cart:1', 'a'), versioned_key('order:1', 'a')
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_version('cart:1')
+        self.assertNotEqual(versioned_key('cart:1', 'a'), cart_key)
+        self.assertEqual(versioned_key('order:1', 'a'), order_key)
+
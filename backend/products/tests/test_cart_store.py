@@ -0,0 +1,64 @@
+from django.test import TestCase
+
+from ..cart_store import get_cart_store
+from ..models import CartItem, ProductVariant
+from .base import ShopFixture
+
+
+class StaleCartStoreTests(ShopFixture, TestCase):
+    """Stored cart lines are a hint; a stale store must not duplicate or fail a line"""
+
+    def setUp(self):
+        super().setUp()
+        self.variant = ProductVariant.objects.create(product=self.product, size='M', stock_quantity=10)
+
+    def make_store_stale(self):
+        # Another process cached the cart before the line existed
+        get_cart_store()._save(self.user.id, {})
+
+    def add_with_stale_store(self, quantity, **data):
+        self.assertEqual(self.add_to_cart(quantity, **data).status_code, 201)
+        self.make_store_stale()
+        return self.add_to_cart(quantity, **data)
+
+    def test_line_without_variant_is_not_duplicated(self):
+        response = self.add_with_stale_store(1)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(list(CartItem.objects.values_list('quantity', flat=True)), [2])
+
+    def test_variant_line_is_updated(self):
+        response = self.add_with_stale_store(2, variant_id=self.variant.id)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(list(CartItem.objects.values_list('quantity', flat=True)), [4])
+
+    def test_batch_add_is_replayed_on_the_database_lines(self):
+        self.add_to_cart(1)
+        self.make_store_stale()
+        response = self.client.post('/api/cart/batch/', {
+            'operations': [{'op': 'add', 'product_id': self.product.id, 'quantity': 2}]
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(CartItem.objects.values_list('quantity', flat=True)), [3])
+
+    def test_update_finds_a_line_the_store_missed(self):
+        self.add_to_cart(1)
+        self.make_store_stale()
+        item = CartItem.objects.get()
+        response = self.client.put(f'/api/cart/update/{item.id}/', {'quantity': 3}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['cart_item']['quantity'], 3)
+        item.refresh_from_db()
+        self.assertEqual(item.quantity, 3)
+        # The stale lines were dropped, so the next read comes from the database
+        self.assertIn(item.id, get_cart_store().get_lines(self.user.id))
+
+    def test_batch_update_finds_a_line_the_store_missed(self):
+        self.add_to_cart(1)
+        self.make_store_stale()
+        item = CartItem.objects.get()
+        response = self.client.post('/api/cart/batch/', {
+            'operations': [{'op': 'update', 'item_id': item.id, 'quantity': 2}]
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        item.refresh_from_db()
+        self.assertEqual(item.quantity, 2)
@@ -0,0 +1,85 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from .. import fastserializers
+from ..models import CartItem, Coupon, Order, OrderItem, Product, ProductVariant
+from ..renderers import FastJSONRenderer
+from ..serializers import (
+    CartItemSerializer, OrderSerializer, OrderSummarySerializer, ProductListSerializer, ProductSerializer,
+)
+from .base import ShopFixture
+
+
+class FastSerializerCacheTests(TestCase):
+    def test_equivalent_field_selections_share_a_plan(self):
+        plan = fastserializers.FastSerializer.for_serializer(ProductSerializer, fields=['name', 'id'])
+        self.assertIs(plan, fastserializers.FastSerializer.for_serializer(
+            ProductSerializer, fields=['id', 'name', 'id', 'no_such_field']
+        ))
+
+    def test_unknown_field_names_do_not_grow_the_cache(self):
+        fastserializers.FastSerializer.for_serializer(ProductSerializer, exclude=['name'])
+        size = fastserializers.FastSerializer._compile.cache_info().currsize
+        for index in range(50):
+            fastserializers.FastSerializer.for_serializer(ProductSerializer, exclude=[f'unknown{index}', 'name'])
+        info = fastserializers.FastSerializer._compile.cache_info()
+        self.assertEqual(info.currsize, size)
+        self.assertEqual(info.maxsize, fastserializers.PLAN_CACHE_SIZE)
+
+
+class FastSerializerOutputTests(ShopFixture, TestCase):
+    """The fast path plus FastJSONRenderer renders the same bytes as DRF plus JSONRenderer"""
+
+    def setUp(self):
+        super().setUp()
+        Product.objects.filter(pk=self.product.pk).update(old_price=Decimal('12.50'), image='products/shirt.jpg')
+        self.variant = ProductVariant.objects.create(product=self.product, size='M', color='Red',
+                                                     price_adjustment=Decimal('1.05'), stock_quantity=0)
+        Product.objects.filter(pk=self.product.pk).update(has_variants=True)
+        # No old price, image or variants
+        self.create_product('Plain', price=Decimal('7.10'))
+        CartItem.objects.create(user=self.user, product=self.product, variant=self.variant, quantity=2)
+        CartItem.objects.create(user=self.user, product=self.product, quantity=1)
+        now = timezone.now()
+        coupon = Coupon.objects.create(code='SAVE10', discount_value=Decimal('10.00'),
+                                       valid_from=now - timedelta(days=1), valid_until=now + timedelta(days=1))
+        for coupon in (coupon, None):
+            order = self.create_order(coupon=coupon, discount_amount=Decimal('1.00') if coupon else Decimal('0'))
+            OrderItem.objects.create(order=order, product=self.product, variant=self.variant, quantity=1,
+                                     price=Decimal('11.05'))
+            OrderItem.objects.create(order=order, product=self.product, quantity=3, price=Decimal('10.00'))
+        self.create_order(shipping_address_line2='Flat 2')
+        self.context = {'request': APIRequestFactory().get('/api/products/')}
+
+    def assertSameBytes(self, serializer_class, queryset, **fieldset):
+        fast_serializer = fastserializers.FastSerializer.for_serializer(serializer_class, **fieldset)
+        self.assertIsNotNone(fast_serializer)
+        expected = JSONRenderer().render(serializer_class(queryset, many=True, context=self.context, **fieldset).data)
+        self.assertEqual(FastJSONRenderer().render(fast_serializer.serialize(queryset, self.context)), expected)
+
+    def test_products(self):
+        products = Product.objects.select_related('category').prefetch_related('variants').order_by('id')
+        self.assertSameBytes(ProductSerializer, products)
+        self.assertSameBytes(ProductListSerializer, products)
+        self.assertSameBytes(ProductSerializer, products, fields=['id', 'price', 'old_price', 'variants'])
+        self.assertSameBytes(ProductListSerializer, products, exclude=['description', 'category_name'])
+
+    def test_cart_items(self):
+        self.assertSameBytes(CartItemSerializer, CartItem.objects.select_related('product', 'variant').order_by('id'))
+
+    def test_orders(self):
+        orders = Order.objects.select_related('user', 'coupon').prefetch_related('items').order_by('id')
+        self.assertSameBytes(OrderSerializer, orders)
+        self.assertSameBytes(OrderSerializer, orders, fields=['id', 'coupon', 'coupon_code', 'total_amount', 'items'])
+        self.assertSameBytes(OrderSerializer, orders, exclude=['items', 'user_email'])
+
+    def test_order_summaries(self):
+        # Summaries always take the DRF serializer; only the renderer differs
+        orders = OrderSummarySerializer.annotate_queryset(Order.objects.order_by('id'))
+        data = OrderSummarySerializer(orders, many=True, context=self.context).data
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
@@ -0,0 +1,78 @@
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from ..models import IdempotencyKey, Order, Payment
+from .base import CHECKOUT, ShopFixture
+
+
+class IdempotentCheckoutTests(ShopFixture, TestCase):
+    stock = 5
+
+    def setUp(self):
+        super().setUp()
+        self.add_to_cart(1)
+
+    def checkout(self, key, **data):
+        return self.client.post('/api/checkout/', {**CHECKOUT, **data}, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_the_first_response(self):
+        first = self.checkout('order-1')
+        retry = self.checkout('order-1')
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json()['order']['id'], first.data['order']['id'])
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_key_reused_for_a_different_request_is_rejected(self):
+        self.checkout('order-1')
+        self.assertEqual(self.checkout('order-1', shipping_city='Mumbai').status_code, 422)
+
+    @override_settings(IDEMPOTENCY_WAIT_TIMEOUT=0, IDEMPOTENCY_PROCESSING_TIMEOUT=60)
+    def test_abandoned_claim_is_taken_over(self):
+        # A first attempt claimed the key, then its worker died
+        self.checkout('order-1')
+        IdempotencyKey.objects.update(status_code=None, response_body=None)
+        Order.objects.all().delete()
+        self.add_to_cart(1)
+
+        self.assertEqual(self.checkout('order-1').status_code, 409)
+        IdempotencyKey.objects.update(created_at=timezone.now() - timedelta(seconds=61))
+        response = self.checkout('order-1')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(IdempotencyKey.objects.get().status_code, 201)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_crash_before_the_response_is_stored_keeps_no_order(self):
+        with mock.patch('products.idempotency.zlib.compress', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.checkout('order-1')
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        self.assertEqual(self.checkout('order-1').status_code, 201)
+        self.assertEqual(Order.objects.count(), 1)
+
+    @override_settings(IDEMPOTENCY_WAIT_TIMEOUT=0, IDEMPOTENCY_PROCESSING_TIMEOUT=60)
+    def test_payment_retries_reuse_one_stripe_key(self):
+        self.checkout('order-1')
+        payment = Payment.objects.get()
+        intent = SimpleNamespace(id='pi_1', status='succeeded', client_secret=None)
+        with mock.patch('products.views.stripe.PaymentIntent.create', return_value=intent) as create:
+            self.client.post('/api/payment/process/', {'payment_id': payment.id}, format='json',
+                             HTTP_IDEMPOTENCY_KEY='pay-1')
+            # The first attempt died before storing its response
+            IdempotencyKey.objects.filter(endpoint='process_payment').update(
+                status_code=None, response_body=None, created_at=timezone.now() - timedelta(seconds=61)
+            )
+            Payment.objects.update(status='pending')
+            self.client.post('/api/payment/process/', {'payment_id': payment.id}, format='json',
+                             HTTP_IDEMPOTENCY_KEY='pay-1')
+        keys = [call.kwargs['idempotency_key'] for call in create.call_args_list]
+        self.assertEqual(len(keys), 2)
+        self.assertEqual(keys[0], keys[1])
+        self.assertNotEqual(keys[0], 'pay-1')
@@ -0,0 +1,19 @@
+from decimal import Decimal
+
+from django.test import TestCase
+
+from ..models import OrderItem, ProductVariant
+from .base import ShopFixture
+
+
+class OrderItemSnapshotTests(ShopFixture, TestCase):
+    def test_items_saved_outside_checkout_are_snapshotted(self):
+        variant = ProductVariant.objects.create(product=self.product, size='M', color='Red', stock_quantity=5)
+        item = OrderItem.objects.create(order=self.create_order(), product=self.product, variant=variant,
+                                        quantity=1, price=Decimal('10.00'))
+        self.product.name = 'Renamed'
+        self.product.save()
+        item.refresh_from_db()
+        self.assertEqual(item.product_name, 'Shirt')
+        self.assertEqual(item.sku, variant.sku)
+        self.assertEqual(item.variant_attributes, {'size': 'M', 'color': 'Red'})
@@ -0,0 +1,36 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from .base import ShopFixture
+
+
+class SearchPaginationTests(ShopFixture, TestCase):
+    def setUp(self):
+        super().setUp()
+        for index in range(11):
+            self.create_product(f'Shirt {index}')
+        self.client = APIClient()
+
+    def test_search_honours_page_size(self):
+        response = self.client.get('/api/products/', {'search': 'shirt', 'page_size': 5})
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertIn('page_size=5', response.data['next'])
+
+    def test_search_still_accepts_limit(self):
+        response = self.client.get('/api/products/', {'search': 'shirt', 'limit': 4})
+        self.assertEqual(len(response.data['results']), 4)
+
+    def test_search_pages_have_the_list_envelope(self):
+        listed = self.client.get('/api/products/', {'page_size': 5}).json()
+        with CaptureQueriesContext(connection) as queries:
+            page = self.client.get('/api/products/', {'search': 'shirt', 'page_size': 5}).json()
+        self.assertEqual(set(page), set(listed))
+        self.assertFalse([query for query in queries if 'COUNT(' in query['sql']])
+        seen = [product['id'] for product in page['results']]
+        while page['next']:
+            page = self.client.get(page['next']).json()
+            seen += [product['id'] for product in page['results']]
+        self.assertEqual(len(seen), 12)
+        self.assertEqual(len(set(seen)), 12)
@@ -0,0 +1,23 @@
+import time
+from decimal import Decimal
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from ..models import PricingRule
+from ..pricing import get_rules
+
+
+class PricingRulesCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(PRICING_RULES_CACHE_TIMEOUT=300)
+    def test_rules_changed_by_another_worker_expire(self):
+        tax_rate = get_rules()[PricingRule.TAX_RATE]
+        # Changed by another worker: this process's cache was not cleared
+        PricingRule.objects.filter(name=PricingRule.TAX_RATE).update(value=Decimal('0.12'))
+        self.assertEqual(get_rules()[PricingRule.TAX_RATE], tax_rate)
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=time.time() + 301):
+            self.assertEqual(get_rules()[PricingRule.TAX_RATE], Decimal('0.12'))
@@ -0,0 +1,97 @@
+from decimal import Decimal
+
+from django.test import TestCase
+from django.utils import timezone
+
+from .. import reporting
+from ..models import Category, DailyCategorySales, DailyProductSales, Order, OrderItem
+from .base import CHECKOUT, ShopFixture
+
+
+class SalesRollupTests(ShopFixture, TestCase):
+    stock = 50
+
+    def create_order(self, quantity=2):
+        with self.captureOnCommitCallbacks(execute=True):
+            order = super().create_order(subtotal=Decimal('10.00') * quantity,
+                                         total_amount=Decimal('10.00') * quantity)
+            OrderItem.objects.create(order=order, product=self.product, quantity=quantity, price=Decimal('10.00'))
+        return order
+
+    def rollups(self):
+        return (
+            list(DailyProductSales.objects.values_list('product', 'orders_count', 'units_sold', 'revenue')),
+            list(DailyCategorySales.objects.values_list('category', 'orders_count', 'units_sold', 'revenue')),
+        )
+
+    def test_orders_created_outside_checkout_are_counted(self):
+        self.create_order(quantity=2)
+        self.assertEqual(self.rollups(), (
+            [(self.product.id, 1, 2, Decimal('20.00'))],
+            [(self.category.id, 1, 2, Decimal('20.00'))],
+        ))
+
+    def test_checkout_is_counted_once_it_commits(self):
+        self.add_to_cart(3)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post('/api/checkout/', CHECKOUT, format='json').status_code, 201)
+        self.assertEqual(self.rollups()[0], [(self.product.id, 1, 3, Decimal('30.00'))])
+
+    def test_cancelling_an_order_never_recorded_leaves_the_rollups_alone(self):
+        order = self.create_order()
+        # As for orders placed before the rollups existed
+        Order.objects.filter(pk=order.pk).update(recorded_sales=None)
+        DailyProductSales.objects.all().delete()
+        DailyCategorySales.objects.all().delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            order.order_status = 'cancelled'
+            order.save()
+            order.delete()
+        self.assertEqual(self.rollups(), ([], []))
+
+    def test_item_edits_cancel_and_delete_follow_the_recorded_sales(self):
+        order = self.create_order(quantity=2)
+        other = self.create_order(quantity=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            item = order.items.get()
+            item.quantity = 5
+            item.save()
+        self.assertEqual(self.rollups()[0], [(self.product.id, 2, 6, Decimal('60.00'))])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            order.order_status = 'cancelled'
+            order.save()
+        self.assertEqual(self.rollups()[0], [(self.product.id, 1, 1, Decimal('10.00'))])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            other.delete()
+        self.assertEqual(self.rollups(), ([], []))
+
+    def test_rebuild_matches_incremental_updates(self):
+        for quantity in (1, 2, 3):
+            self.create_order(quantity=quantity)
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.objects.first().delete()
+        incremental = self.rollups()
+        self.assertEqual(reporting.rebuild(chunk_size=1), 2)
+        self.assertEqual(self.rollups(), incremental)
+        # Rebuilt orders are recorded, so a later cancel takes out exactly their sales
+        with self.captureOnCommitCallbacks(execute=True):
+            for order in Order.objects.all():
+                order.order_status = 'cancelled'
+                order.save()
+        self.assertEqual(self.rollups(), ([], []))
+
+    def test_top_products_follow_the_category_at_the_time_of_sale(self):
+        self.create_order(quantity=2)
+        self.product.category = Category.objects.create(name='Tops')
+        self.product.save()
+        self.create_order(quantity=1)
+        self.create_order(quantity=1)
+        today = timezone.localdate()
+        for category in Category.objects.all():
+            top = reporting.top_products(today, today, category_id=category.id)
+            sales = reporting.category_sales(today, today)
+            self.assertEqual([row['units_sold'] for row in top],
+                             [row['units_sold'] for row in sales if row['category'] == category.id])
+        self.assertEqual(reporting.top_products(today, today)[0]['units_sold'], 4)
@@ -0,0 +1,98 @@
+import threading
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from ..caching import get_catalog_version
+from ..cart_store import get_cart_store
+from ..models import CartItem, Order, StockReservation
+from .base import CHECKOUT, ShopFixture
+
+
+class StockReservationTests(ShopFixture, TestCase):
+    """A cart line holds its stock against other carts until it expires or is removed"""
+    stock = 3
+
+    def setUp(self):
+        super().setUp()
+        self.other_client = self.api_client(User.objects.create_user('other', password='password'))
+
+    def test_held_stock_is_not_available_to_other_carts(self):
+        self.assertEqual(self.add_to_cart(2).status_code, 201)
+        response = self.add_to_cart(2, client=self.other_client)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Only 1 items available', str(response.data))
+        self.assertEqual(self.add_to_cart(1, client=self.other_client).status_code, 201)
+
+    def test_expired_and_removed_holds_free_the_stock(self):
+        self.add_to_cart(3)
+        StockReservation.objects.update(expires_at=timezone.now())
+        self.assertEqual(self.add_to_cart(3, client=self.other_client).status_code, 201)
+
+        item_id = CartItem.objects.get(user__username='other').id
+        self.assertEqual(self.other_client.delete(f'/api/cart/remove/{item_id}/').status_code, 200)
+        self.assertFalse(StockReservation.objects.filter(user__username='other').exists())
+
+    def test_removing_a_line_the_store_missed_releases_its_hold(self):
+        self.add_to_cart(3)
+        # Another process cached the cart before the line existed
+        get_cart_store()._save(self.user.id, {})
+        item_id = CartItem.objects.get().id
+        self.assertEqual(self.client.delete(f'/api/cart/remove/{item_id}/').status_code, 200)
+        self.assertFalse(CartItem.objects.exists())
+        self.assertFalse(StockReservation.objects.exists())
+
+
+class ConcurrentCheckoutTests(ShopFixture, TransactionTestCase):
+    """Checkouts racing for the last units never sell more than the stock"""
+    stock = 3
+    buyers = 8
+
+    def setUp(self):
+        super().setUp()
+        # Cart rows without holds, so every checkout races for the stock itself
+        self.users = [User.objects.create_user(f'buyer{index}', password='password') for index in range(self.buyers)]
+        CartItem.objects.bulk_create([CartItem(user=user, product=self.product, quantity=1) for user in self.users])
+
+    def test_no_oversell(self):
+        barrier = threading.Barrier(self.buyers)
+        results = []
+
+        def checkout(user):
+            client = self.api_client(user)
+            try:
+                barrier.wait()
+                results.append(client.post('/api/checkout/', CHECKOUT, format='json').status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=checkout, args=(user,)) for user in self.users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.product.refresh_from_db()
+        self.assertEqual(results.count(201), self.stock)
+        self.assertEqual(sorted(set(results)), [201, 400])
+        self.assertEqual(self.product.stock_quantity, 0)
+        self.assertEqual(Order.objects.count(), self.stock)
+
+
+
+class CatalogVersionOnSaleTests(ShopFixture, TestCase):
+    stock = 3
+
+    def checkout(self, quantity):
+        self.add_to_cart(quantity)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post('/api/checkout/', CHECKOUT, format='json').status_code, 201)
+
+    def test_only_selling_out_invalidates_the_catalog(self):
+        version = get_catalog_version()
+        self.checkout(2)
+        self.assertEqual(get_catalog_version(), version)
+        self.checkout(1)
+        self.assertNotEqual(get_catalog_version(), version)
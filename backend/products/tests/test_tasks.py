@@ -0,0 +1,18 @@
+from decimal import Decimal
+
+from django.core import mail
+from django.test import TestCase
+
+from ..models import OrderItem, Product
+from ..tasks import send_order_confirmation
+from .base import ShopFixture
+
+
+class OrderConfirmationTests(ShopFixture, TestCase):
+    def test_confirmation_email_reads_the_snapshot(self):
+        order = self.create_order()
+        OrderItem.objects.create(order=order, product=self.product, quantity=2, price=Decimal('10.00'))
+        Product.objects.filter(pk=self.product.pk).update(name='Renamed')
+        with self.assertNumQueries(2):
+            send_order_confirmation(order.id)
+        self.assertIn('2 x Shirt', mail.outbox[0].body)
@@ -10,12 +10,16 @@ urlpatterns = [
     # Router URLs
     path('', include(router.urls)),
     
+    # Catalog Sync
+    path('catalog/sync/', views.catalog_sync, name='catalog-sync'),
+
     # Cart Management
     path('cart/', views.cart_list, name='cart-list'),
     path('cart/add/', views.add_to_cart, name='add-to-cart'),
     path('cart/update/<int:item_id>/', views.update_cart_item, name='update-cart-item'),
     path('cart/remove/<int:item_id>/', views.remove_from_cart, name='remove-from-cart'),
     path('cart/clear/', views.clear_cart, name='clear-cart'),
+    path('cart/batch/', views.batch_update_cart, name='batch-update-cart'),
     
     # Coupon Management
     path('coupons/validate/', views.validate_coupon, name='validate-coupon'),
@@ -32,4 +36,9 @@ urlpatterns = [
     path('wishlist/', views.wishlist_list, name='wishlist-list'),
     path('wishlist/add/', views.add_to_wishlist, name='add-to-wishlist'),
     path('wishlist/remove/<int:item_id>/', views.remove_from_wishlist, name='remove-from-wishlist'),
+
+    # Sales Reports
+    path('reports/sales/daily/', views.sales_daily, name='sales-daily'),
+    path('reports/sales/products/', views.sales_top_products, name='sales-top-products'),
+    path('reports/sales/categories/', views.sales_categories, name='sales-categories'),
 ]
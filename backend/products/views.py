@@ -1,76 +1,266 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import api_view, permission_classes, action
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAdminUser, IsAuthenticated, AllowAny
 from rest_framework.response import Response
-from django.shortcuts import get_object_or_404
 from django.db import transaction
-from decimal import Decimal
+from django.db.models import prefetch_related_objects
 import stripe
 from django.conf import settings
 
 from .models import (
-    Category, Product, ProductVariant, CartItem, Order, OrderItem, 
-    Payment, Wishlist, Coupon, CouponUsage
+    Category, Product, CartItem, Order, OrderItem, 
+    Payment, Wishlist, CouponUsage
 )
 from .serializers import (
-    CategorySerializer, ProductSerializer, ProductVariantSerializer, CartItemSerializer,
-    OrderSerializer, CheckoutSerializer, PaymentSerializer, WishlistSerializer,
-    CouponSerializer, CouponValidationSerializer
+    CategorySerializer, ProductSerializer, ProductListSerializer, CartItemSerializer,
+    CartBatchSerializer,
+    OrderSerializer, OrderSummarySerializer, CheckoutSerializer, PaymentSerializer, WishlistSerializer,
+    CouponValidationSerializer
 )
+from .caching import CatalogCacheMixin, cache_order, get_cached_order
+from .idempotency import idempotent
+from .cart_store import CartOperationError, get_cart_store
+from .pagination import KeysetPagination, SearchResultsPagination
+from .pricing import PricingEngine
+from . import facets as product_facets
+from . import sync as catalog_sync_engine
+from . import search as product_search
+from . import fastserializers
+from . import cart as cart_service
+from . import jobs
+from . import reporting
+from . import reservations
 
 # Configure Stripe
 stripe.api_key = getattr(settings, 'STRIPE_SECRET_KEY', '')
 
-class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
+def get_fieldset(request):
+    """Parse ?fields= / ?exclude= into keyword arguments for a SparseFieldsetMixin serializer"""
+    fieldset = {}
+    for param in ('fields', 'exclude'):
+        value = request.query_params.get(param)
+        if value:
+            fieldset[param] = [name.strip() for name in value.split(',') if name.strip()]
+    return fieldset
+
+def apply_fieldset(queryset, serializer_class, fieldset, required=()):
+    """Narrow a queryset to the columns the selected serializer fields read"""
+    projection = serializer_class.get_projection(**fieldset)
+    if projection is None:
+        return queryset
+    only, related = projection
+    queryset = queryset.select_related(None)
+    if related:
+        queryset = queryset.select_related(*related)
+    return queryset.only(*only, *required)
+
+def get_fast_serializer(serializer_class, fieldset=None):
+    """The compiled fast-path serializer, or None when disabled or unsupported"""
+    if not fastserializers.is_enabled():
+        return None
+    return fastserializers.FastSerializer.for_serializer(serializer_class, **(fieldset or {}))
+
+def serialize_cart_items(cart_items):
+    """Serialize cart items with their products and variants"""
+    cart_items = cart_items.select_related('product', 'variant')
+    fast_serializer = get_fast_serializer(CartItemSerializer)
+    if fast_serializer is not None:
+        return fast_serializer.serialize(cart_items)
+    return CartItemSerializer(cart_items, many=True).data
+
+class SparseFieldsetViewMixin:
+    """Pass the request's ?fields= / ?exclude= to the viewset's serializer"""
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.update(get_fieldset(self.request))
+        return super().get_serializer(*args, **kwargs)
+
+class CategoryViewSet(CatalogCacheMixin, SparseFieldsetViewMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Category.objects.filter(is_active=True)
     serializer_class = CategorySerializer
     permission_classes = [AllowAny]
 
-class ProductViewSet(viewsets.ReadOnlyModelViewSet):
+    def get_queryset(self):
+        return apply_fieldset(super().get_queryset(), self.serializer_class, get_fieldset(self.request))
+
+class ProductViewSet(CatalogCacheMixin, SparseFieldsetViewMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Product.objects.filter(is_active=True)
     serializer_class = ProductSerializer
     permission_classes = [AllowAny]
+    pagination_class = KeysetPagination
+    max_batch_size = 100
+
+    @property
+    def paginator(self):
+        # Ranked search results cannot be paged on the (-created_at, id) keyset
+        if not hasattr(self, '_paginator'):
+            if self.request.query_params.get('search'):
+                self._paginator = SearchResultsPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    def get_serializer_class(self):
+        # List pages use the compact representation; the detail route keeps
+        # the full payload with nested variants.
+        if self.action == 'list':
+            return ProductListSerializer
+        return ProductSerializer
 
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = self.get_filtered_queryset()
+        search = self.request.query_params.get('search', None)
+        if search:
+            queryset = product_search.search_queryset(queryset, search)
+        return queryset
+
+    def get_filtered_queryset(self):
+        """Products matching the request filters, before any search is applied"""
+        fieldset = get_fieldset(self.request)
+        serializer_class = self.get_serializer_class()
+        queryset = super().get_queryset().select_related('category')
+        # created_at is the keyset pagination key
+        queryset = apply_fieldset(queryset, serializer_class, fieldset, required=['created_at'])
+        if serializer_class.selects('variants', **fieldset):
+            queryset = queryset.prefetch_related('variants')
         category = self.request.query_params.get('category', None)
         featured = self.request.query_params.get('featured', None)
-        search = self.request.query_params.get('search', None)
 
         if category:
             queryset = queryset.filter(category__id=category)
         if featured:
             queryset = queryset.filter(is_featured=True)
-        if search:
-            queryset = queryset.filter(name__icontains=search)
+        return product_facets.filter_products(queryset, self.request.query_params)
 
-        return queryset
+    def list(self, request, *args, **kwargs):
+        fast_serializer = get_fast_serializer(self.get_serializer_class(), get_fieldset(request))
+        if fast_serializer is None:
+            response = super().list(request, *args, **kwargs)
+        else:
+            # Same payload as the DRF serializer, built from values() rows
+            queryset = self.filter_queryset(self.get_queryset())
+            page = self.paginate_queryset(fast_serializer.values(queryset, 'created_at', 'id'))
+            data = fast_serializer.serialize_rows(page, self.get_serializer_context())
+            response = self.get_paginated_response(data)
+        if request.query_params.get('facets'):
+            # Facet counts nest the queryset as a subquery, which the ranked
+            # search join does not support, so match without ranking here.
+            queryset = self.get_filtered_queryset()
+            search = request.query_params.get('search', None)
+            if search:
+                queryset = product_search.filter_queryset(queryset, search)
+            response.data['facets'] = product_facets.facet_counts(queryset)
+        return response
+
+    @action(detail=False, methods=['get', 'post'])
+    def batch(self, request):
+        """Fetch many products at once, in the order requested"""
+        if request.method == 'POST':
+            ids = request.data.get('ids', [])
+        else:
+            ids = request.query_params.get('ids', '').split(',')
+
+        try:
+            ids = [int(product_id) for product_id in ids if str(product_id).strip()]
+        except (TypeError, ValueError):
+            return Response({
+                'success': False,
+                'message': 'ids must be a list of product ids'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        if len(ids) > self.max_batch_size:
+            return Response({
+                'success': False,
+                'message': f'At most {self.max_batch_size} products can be fetched at once'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        # Deduplicate while keeping the requested order
+        ids = list(dict.fromkeys(ids))
+        fieldset = get_fieldset(request)
+        products = Product.objects.filter(id__in=ids).select_related('category')
+        products = apply_fieldset(products, ProductSerializer, fieldset, required=['is_active'])
+        if ProductSerializer.selects('variants', **fieldset):
+            products = products.prefetch_related('variants')
+        products_by_id = {product.id: product for product in products}
+
+        found = [products_by_id[product_id] for product_id in ids
+                 if product_id in products_by_id and products_by_id[product_id].is_active]
+        return Response({
+            'success': True,
+            'products': self.get_serializer(found, many=True).data,
+            'missing': [product_id for product_id in ids if product_id not in products_by_id],
+            'inactive': [product_id for product_id in ids
+                         if product_id in products_by_id and not products_by_id[product_id].is_active],
+        })
+
+# Catalog Sync
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def catalog_sync(request):
+    """Get catalog changes since the watermark returned by the previous sync"""
+    try:
+        limit = int(request.query_params.get('limit', catalog_sync_engine.DEFAULT_LIMIT))
+    except ValueError:
+        limit = catalog_sync_engine.DEFAULT_LIMIT
+    limit = min(max(limit, 1), catalog_sync_engine.DEFAULT_LIMIT)
+
+    try:
+        payload = catalog_sync_engine.catalog_changes(request.query_params.get('watermark'), limit=limit)
+    except catalog_sync_engine.InvalidWatermark as e:
+        return Response({
+            'success': False,
+            'message': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response({'success': True, **payload})
 
 # Cart Management Views
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def cart_list(request):
     """Get user's cart items"""
-    cart_items = CartItem.objects.filter(user=request.user).select_related('product', 'variant')
-    serializer = CartItemSerializer(cart_items, many=True)
-    
-    # Calculate cart totals
-    subtotal = sum(item.total_price for item in cart_items)
-    tax_rate = Decimal('0.18')  # 18% GST
-    tax_amount = subtotal * tax_rate
-    shipping_cost = Decimal('50.00') if subtotal < 500 else Decimal('0.00')  # Free shipping above ₹500
-    total = subtotal + tax_amount + shipping_cost
-    
     return Response({
         'success': True,
-        'cart_items': serializer.data,
-        'summary': {
-            'items_count': cart_items.count(),
-            'subtotal': str(subtotal),
-            'tax_amount': str(tax_amount),
-            'shipping_cost': str(shipping_cost),
-            'total': str(total)
+        **get_cart_payload(request.user)
+    })
+
+def get_cart_payload(user):
+    """The user's cart items and summary, from the per-user cart cache"""
+    cart, version = cart_service.get_cached_cart(user.id)
+    if cart is None:
+        cart_items = CartItem.objects.filter(user=user)
+        cart = {
+            'cart_items': serialize_cart_items(cart_items),
+            'summary': cart_service.cart_quote(user).as_summary()
         }
+        cart_service.cache_cart(user.id, version, cart)
+    return cart
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def batch_update_cart(request):
+    """Apply a list of add, update, remove and clear operations to the cart at once"""
+    serializer = CartBatchSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response({
+            'success': False,
+            'message': 'Invalid cart operations',
+            'errors': serializer.errors
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        get_cart_store().apply_operations(request.user.id, serializer.validated_data['operations'])
+    except CartOperationError as e:
+        return Response({
+            'success': False,
+            'message': 'Failed to update cart',
+            'errors': e.errors
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response({
+        'success': True,
+        'message': 'Cart updated successfully',
+        **get_cart_payload(request.user)
     })
 
 @api_view(['POST'])
@@ -84,7 +274,7 @@ def add_to_cart(request):
         return Response({
             'success': True,
             'message': 'Item added to cart successfully',
-            'cart_item': CartItemSerializer(cart_item).data
+            'cart_item': serialize_cart_items(CartItem.objects.filter(id=cart_item.id))[0]
         }, status=status.HTTP_201_CREATED)
     
     return Response({
@@ -97,14 +287,14 @@ def add_to_cart(request):
 @permission_classes([IsAuthenticated])
 def update_cart_item(request, item_id):
     """Update cart item quantity"""
-    try:
-        cart_item = CartItem.objects.get(id=item_id, user=request.user)
-    except CartItem.DoesNotExist:
+    line = get_cart_store().get_line(request.user.id, item_id)
+    if line is None:
         return Response({
             'success': False,
             'message': 'Cart item not found'
         }, status=status.HTTP_404_NOT_FOUND)
     
+    cart_item = CartItem(user=request.user, **line)
     serializer = CartItemSerializer(cart_item, data=request.data, partial=True)
     
     if serializer.is_valid():
@@ -112,7 +302,7 @@ def update_cart_item(request, item_id):
         return Response({
             'success': True,
             'message': 'Cart item updated successfully',
-            'cart_item': CartItemSerializer(updated_item).data
+            'cart_item': serialize_cart_items(CartItem.objects.filter(id=updated_item.id))[0]
         })
     
     return Response({
@@ -125,24 +315,21 @@ def update_cart_item(request, item_id):
 @permission_classes([IsAuthenticated])
 def remove_from_cart(request, item_id):
     """Remove item from cart"""
-    try:
-        cart_item = CartItem.objects.get(id=item_id, user=request.user)
-        cart_item.delete()
+    if get_cart_store().remove(request.user.id, item_id):
         return Response({
             'success': True,
             'message': 'Item removed from cart successfully'
         })
-    except CartItem.DoesNotExist:
-        return Response({
-            'success': False,
-            'message': 'Cart item not found'
-        }, status=status.HTTP_404_NOT_FOUND)
+    return Response({
+        'success': False,
+        'message': 'Cart item not found'
+    }, status=status.HTTP_404_NOT_FOUND)
 
 @api_view(['DELETE'])
 @permission_classes([IsAuthenticated])
 def clear_cart(request):
     """Clear all items from cart"""
-    deleted_count = CartItem.objects.filter(user=request.user).delete()[0]
+    deleted_count = get_cart_store().clear(request.user.id)
     return Response({
         'success': True,
         'message': f'Cart cleared successfully. {deleted_count} items removed.'
@@ -181,57 +368,64 @@ def validate_coupon(request):
 # Checkout and Order Management
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent('checkout')
 def checkout(request):
     """Create order from cart items"""
-    serializer = CheckoutSerializer(data=request.data, context={'request': request})
-    
-    if not serializer.is_valid():
-        return Response({
-            'success': False,
-            'message': 'Invalid checkout data',
-            'errors': serializer.errors
-        }, status=status.HTTP_400_BAD_REQUEST)
-    
     try:
         with transaction.atomic():
-            # Get cart items
-            cart_items = CartItem.objects.filter(user=request.user).select_related('product', 'variant')
+            # Lock and load the cart once, with products and variants; the
+            # same snapshot is validated, priced and turned into the order
+            cart_items = cart_service.cart_snapshot(request.user, lock=True)
+            serializer = CheckoutSerializer(
+                data=request.data, context={'request': request, 'cart_items': cart_items}
+            )
             
-            if not cart_items.exists():
+            if not serializer.is_valid():
                 return Response({
                     'success': False,
-                    'message': 'Cart is empty'
+                    'message': 'Invalid checkout data',
+                    'errors': serializer.errors
                 }, status=status.HTTP_400_BAD_REQUEST)
             
-            # Validate stock one more time for each item
-            for cart_item in cart_items:
-                if cart_item.is_out_of_stock:
-                    return Response({
-                        'success': False,
-                        'message': f'{cart_item.product.name} is out of stock'
-                    }, status=status.HTTP_400_BAD_REQUEST)
-                
-                if cart_item.quantity > cart_item.available_stock:
-                    return Response({
-                        'success': False,
-                        'message': f'Insufficient stock for {cart_item.product.name}. Available: {cart_item.available_stock}'
-                    }, status=status.HTTP_400_BAD_REQUEST)
-            
-            # Calculate totals
-            subtotal = sum(item.total_price for item in cart_items)
+            # Turn the cart's stock holds into sales, holding again any that
+            # expired, and take the stock off with conditional UPDATEs
+            try:
+                reservations.convert(request.user.id, [
+                    (item.product_id, item.variant_id, item.quantity) for item in cart_items
+                ])
+            except reservations.InsufficientStock as error:
+                cart_item = next(
+                    item for item in cart_items if (item.product_id, item.variant_id) in error.available
+                )
+                available_stock = error.available[cart_item.product_id, cart_item.variant_id]
+                if not available_stock:
+                    message = f'{cart_item.product.name} is out of stock'
+                else:
+                    message = f'Insufficient stock for {cart_item.product.name}. Available: {available_stock}'
+                return Response({
+                    'success': False,
+                    'message': message
+                }, status=status.HTTP_400_BAD_REQUEST)
             
-            # Apply coupon discount if provided
+            # Calculate totals, with the coupon discount if provided
             coupon = serializer.validated_data.get('coupon')
-            discount_amount = Decimal('0.00')
-            if coupon:
-                discount_amount = coupon.calculate_discount(subtotal)
+            quote = PricingEngine(coupon=coupon).price_lines(
+                (item.unit_price, item.quantity) for item in cart_items
+            )
+            subtotal = quote.subtotal
+            discount_amount = quote.discount_amount
+            tax_amount = quote.tax_amount
+            shipping_cost = quote.shipping_cost
+            total_amount = quote.total
             
-            # Calculate tax and shipping
-            tax_rate = Decimal('0.18')  # 18% GST
-            discounted_subtotal = subtotal - discount_amount
-            tax_amount = discounted_subtotal * tax_rate
-            shipping_cost = Decimal('50.00') if discounted_subtotal < 500 else Decimal('0.00')  # Free shipping above ₹500
-            total_amount = discounted_subtotal + tax_amount + shipping_cost
+            # Count the coupon use up front, so concurrent checkouts cannot
+            # exceed its usage limit
+            if coupon and not coupon.redeem():
+                transaction.set_rollback(True)
+                return Response({
+                    'success': False,
+                    'message': 'Coupon usage limit has been reached'
+                }, status=status.HTTP_400_BAD_REQUEST)
             
             # Create order
             order_data = serializer.validated_data
@@ -254,24 +448,23 @@ def checkout(request):
                 total_amount=total_amount,
             )
             
-            # Create order items and update stock
+            # Create order items in one INSERT (stock was taken off when the
+            # holds were converted). bulk_create() skips OrderItem.save(), so
+            # the totals are computed here, along with the product snapshot.
+            order_items = []
             for cart_item in cart_items:
-                # Create order item
-                OrderItem.objects.create(
+                unit_price = cart_item.unit_price
+                order_item = OrderItem(
                     order=order,
                     product=cart_item.product,
+                    variant=cart_item.variant,
                     quantity=cart_item.quantity,
-                    price=cart_item.unit_price,
-                    total=cart_item.total_price
+                    price=unit_price,
+                    total=cart_item.quantity * unit_price
                 )
-                
-                # Update stock (product or variant)
-                if cart_item.variant:
-                    cart_item.variant.stock_quantity -= cart_item.quantity
-                    cart_item.variant.save()
-                else:
-                    cart_item.product.stock_quantity -= cart_item.quantity
-                    cart_item.product.save()
+                order_item.take_snapshot()
+                order_items.append(order_item)
+            OrderItem.objects.bulk_create(order_items)
             
             # Record coupon usage if applicable
             if coupon:
@@ -281,9 +474,6 @@ def checkout(request):
                     order=order,
                     discount_amount=discount_amount
                 )
-                # Update coupon usage count
-                coupon.used_count += 1
-                coupon.save()
             
             # Create payment record
             payment = Payment.objects.create(
@@ -294,8 +484,13 @@ def checkout(request):
             )
             
             # Clear cart
-            cart_items.delete()
+            CartItem.objects.filter(id__in=[item.id for item in cart_items]).delete()
             
+            # Post-order work runs in the background once the order commits
+            jobs.enqueue('send_order_confirmation', order_id=order.id)
+            jobs.enqueue('notify_low_stock', product_ids=sorted({item.product_id for item in order_items}))
+            
+            prefetch_related_objects([order], 'items')
             return Response({
                 'success': True,
                 'message': 'Order created successfully',
@@ -312,34 +507,72 @@ def checkout(request):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def order_list(request):
-    """Get user's orders"""
-    orders = Order.objects.filter(user=request.user).prefetch_related('items__product')
-    serializer = OrderSerializer(orders, many=True)
+    """
+    Get user's orders, newest first, a page at a time (``?cursor=`` /
+    ``?page_size=``). ``?summary=1`` returns order headers with an item count
+    and the first item's thumbnail; the items are on the detail route.
+    """
+    orders = Order.objects.filter(user=request.user)
+    paginator = KeysetPagination()
+    if request.query_params.get('summary'):
+        page = paginator.paginate_queryset(OrderSummarySerializer.annotate_queryset(orders), request)
+        orders_data = OrderSummarySerializer(page, many=True).data
+    else:
+        fieldset = get_fieldset(request)
+        fast_serializer = get_fast_serializer(OrderSerializer, fieldset)
+        if fast_serializer is not None:
+            page = paginator.paginate_queryset(fast_serializer.values(orders, 'created_at', 'id'), request)
+            orders_data = fast_serializer.serialize_rows(page)
+        else:
+            orders = apply_fieldset(orders, OrderSerializer, fieldset, required=['created_at'])
+            if OrderSerializer.selects('items', **fieldset):
+                orders = orders.prefetch_related('items')
+            page = paginator.paginate_queryset(orders, request)
+            orders_data = OrderSerializer(page, many=True, **fieldset).data
     return Response({
         'success': True,
-        'orders': serializer.data
+        'orders': orders_data,
+        'next': paginator.get_next_link()
     })
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def order_detail(request, order_id):
-    """Get order details"""
-    try:
-        order = Order.objects.get(id=order_id, user=request.user)
-        serializer = OrderSerializer(order)
-        return Response({
-            'success': True,
-            'order': serializer.data
-        })
-    except Order.DoesNotExist:
-        return Response({
-            'success': False,
-            'message': 'Order not found'
-        }, status=status.HTTP_404_NOT_FOUND)
+    """Get order details; delivered and cancelled orders are served from the cache"""
+    fieldset = get_fieldset(request)
+    order_data, cache_key = get_cached_order(request.user.id, order_id, fieldset)
+    if order_data is None:
+        orders = Order.objects.filter(user=request.user, id=order_id)
+        fast_serializer = get_fast_serializer(OrderSerializer, fieldset)
+        if fast_serializer is not None:
+            rows = list(fast_serializer.values(orders, 'order_status'))
+            if rows:
+                order_status = rows[0]['order_status']
+                order_data = fast_serializer.serialize_rows(rows)[0]
+        else:
+            orders = apply_fieldset(orders.select_related('user', 'coupon'), OrderSerializer, fieldset,
+                                    required=['order_status'])
+            if OrderSerializer.selects('items', **fieldset):
+                orders = orders.prefetch_related('items')
+            order = orders.first()
+            if order is not None:
+                order_status = order.order_status
+                order_data = OrderSerializer(order, **fieldset).data
+        if order_data is None:
+            return Response({
+                'success': False,
+                'message': 'Order not found'
+            }, status=status.HTTP_404_NOT_FOUND)
+        cache_order(cache_key, order_status, order_data)
+    return Response({
+        'success': True,
+        'order': order_data
+    })
 
 # Payment Processing
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent('process_payment', atomic=False)
 def process_payment(request):
     """Process payment using Stripe"""
     payment_id = request.data.get('payment_id')
@@ -360,14 +593,16 @@ def process_payment(request):
                 'message': 'Payment already completed'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Create Stripe payment intent
+        # Create Stripe payment intent. A retry with the same Idempotency-Key
+        # gets the same intent back from Stripe instead of a second charge.
         intent = stripe.PaymentIntent.create(
             amount=int(payment.amount * 100),  # Convert to paise
             currency=payment.currency.lower(),
             payment_method=payment_method_id,
             confirmation_method='manual',
             confirm=True,
-            return_url='https://your-app.com/return'
+            return_url='https://your-app.com/return',
+            idempotency_key=getattr(request, 'idempotency_key', None)
         )
         
         # Update payment record
@@ -414,8 +649,13 @@ def process_payment(request):
 @permission_classes([IsAuthenticated])
 def wishlist_list(request):
     """Get user's wishlist"""
-    wishlist_items = Wishlist.objects.filter(user=request.user).select_related('product')
-    serializer = WishlistSerializer(wishlist_items, many=True)
+    fieldset = get_fieldset(request)
+    wishlist_items = apply_fieldset(
+        Wishlist.objects.filter(user=request.user).select_related('product'), WishlistSerializer, fieldset
+    )
+    if WishlistSerializer.selects('product', **fieldset):
+        wishlist_items = wishlist_items.select_related('product__category').prefetch_related('product__variants')
+    serializer = WishlistSerializer(wishlist_items, many=True, **fieldset)
     return Response({
         'success': True,
         'wishlist_items': serializer.data
@@ -457,3 +697,68 @@ def remove_from_wishlist(request, item_id):
             'success': False,
             'message': 'Wishlist item not found'
         }, status=status.HTTP_404_NOT_FOUND)
+
+# Sales Reports
+def _report_params(request):
+    """Parse the date range, ?order_by= and ?category= shared by the report views"""
+    start, end = reporting.parse_range(request.query_params.get('start'), request.query_params.get('end'))
+    order_by = request.query_params.get('order_by', 'revenue')
+    if order_by not in ('revenue', 'units_sold'):
+        raise ValueError('order_by must be revenue or units_sold')
+    category = request.query_params.get('category')
+    return start, end, order_by, int(category) if category else None
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def sales_daily(request):
+    """Units and revenue per day between ?start= and ?end= (YYYY-MM-DD, default last 30 days)"""
+    try:
+        start, end, _, category = _report_params(request)
+    except ValueError as e:
+        return Response({
+            'success': False,
+            'message': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+    return Response({
+        'success': True,
+        'start': start,
+        'end': end,
+        'days': reporting.daily_sales(start, end, category_id=category)
+    })
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def sales_top_products(request):
+    """Best-selling products between ?start= and ?end=, by ?order_by=revenue|units_sold"""
+    try:
+        start, end, order_by, category = _report_params(request)
+        limit = min(max(int(request.query_params.get('limit', 10)), 1), reporting.MAX_LIMIT)
+    except ValueError as e:
+        return Response({
+            'success': False,
+            'message': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+    return Response({
+        'success': True,
+        'start': start,
+        'end': end,
+        'products': reporting.top_products(start, end, limit=limit, order_by=order_by, category_id=category)
+    })
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def sales_categories(request):
+    """Sales per category between ?start= and ?end=, by ?order_by=revenue|units_sold"""
+    try:
+        start, end, order_by, _ = _report_params(request)
+    except ValueError as e:
+        return Response({
+            'success': False,
+            'message': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+    return Response({
+        'success': True,
+        'start': start,
+        'end': end,
+        'categories': reporting.category_sales(start, end, order_by=order_by)
+    })